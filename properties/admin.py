@@ -11,8 +11,9 @@ from .models import (
 
 @admin.register(Property)
 class PropertyAdmin(admin.ModelAdmin):
-  list_display = ('title', 'price', 'address', 'status', 'property_category', 'property_type', 'created_at', 'updated_at')
-  list_filter = ('status', 'property_category', 'property_type')
+  list_display = ('title', 'price', 'address', 'status', 'availability', 'property_category', 'property_type', 'created_at', 'updated_at')
+  list_filter = ('status', 'availability', 'property_category', 'property_type')
+  readonly_fields = ('availability',)
   search_fields = ('title', 'address', 'description')
 
 @admin.register(PropertyCategory)
@@ -0,0 +1,128 @@
+import datetime
+from decimal import Decimal
+
+from django.db.models import Case, DecimalField, F, Min, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Least, NullIf
+
+from .models import Agreement, Customer, Payment, UtilityBill
+
+# Who owes how much, per agreement or per customer, as of a date. Rent is
+# the rent schedule alone (payments with a due_date, see schedules.py):
+# expected rent is the scheduled payments that have fallen due, paid is
+# those of them that are completed, and payments without a due_date are
+# not rent, so an agreement without a schedule owes no rent. Unpaid bills
+# are bill_amount - paid_amount of bills not fully paid. Every figure is a
+# correlated aggregate subquery on the report's rows, so the database does
+# the summing over an index seek per row. Sorting has to evaluate its key
+# for every row, so the ids are sorted first with only the sort and filter
+# columns computed, and the full figures are computed for one page alone.
+# Rows are overdue since the oldest scheduled payment or bill past its due
+# date that is still open.
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+ZERO = Value(Decimal('0'), output_field=MONEY)
+NEVER = Value(datetime.date.max)
+
+LEVELS = {
+  # level: (model, path from payments and bills to the model)
+  'agreement': (Agreement, 'agreement'),
+  'customer': (Customer, 'agreement__customer'),
+}
+LEVEL_FIELDS = {
+  'agreement': {
+    'agreement_id': 'id',
+    'status': 'status',
+    'property_id': 'property_id',
+    'property_title': 'property__title',
+    'customer_id': 'customer_id',
+    'customer_name': 'customer__user__name',
+  },
+  'customer': {
+    'customer_id': 'id',
+    'customer_name': 'user__name',
+    'customer_email': 'user__email',
+    'phone_number': 'phone_number',
+  },
+}
+MONEY_FIELDS = ('expected_rent', 'paid', 'rent_due', 'unpaid_bills', 'balance')
+# ?ordering= values; days_overdue sorts on the date the row became overdue
+ORDERINGS = MONEY_FIELDS + ('days_overdue',)
+
+
+def total(queryset, key, expression):
+  return Coalesce(
+    Subquery(queryset.order_by().values(key).annotate(total=Sum(expression)).values('total')[:1], output_field=MONEY),
+    ZERO
+  )
+
+
+def earliest(queryset, key, field):
+  return Subquery(queryset.order_by().values(key).annotate(earliest=Min(field)).values('earliest')[:1])
+
+
+def figures(level, as_of):
+  # Each figure stands alone, so any subset can be annotated
+  _, key = LEVELS[level]
+  payments = Payment.objects.filter(**{key: OuterRef('pk')})
+  scheduled = payments.filter(due_date__lte=as_of)
+  bills = UtilityBill.objects.filter(**{key: OuterRef('pk')}).filter(
+    Q(paid_amount__isnull=True) | Q(paid_amount__lt=F('bill_amount'))
+  )
+
+  # Expected minus paid in a single pass over the scheduled payments
+  rent_due = total(scheduled, key, Case(
+    When(status='completed', then=ZERO), default=F('amount'), output_field=MONEY
+  ))
+  unpaid_bills = total(bills, key, F('bill_amount') - Coalesce(F('paid_amount'), ZERO))
+  return {
+    'expected_rent': total(scheduled, key, F('amount')),
+    'paid': total(scheduled.filter(status='completed'), key, F('amount')),
+    'rent_due': rent_due,
+    'unpaid_bills': unpaid_bills,
+    'balance': rent_due + unpaid_bills,
+    # Least() is NULL if either side is, so a missing side counts as never
+    'overdue_since': NullIf(Least(
+      Coalesce(earliest(scheduled.exclude(status='completed'), key, 'due_date'), NEVER),
+      Coalesce(earliest(bills.filter(due_date__lt=as_of), key, 'due_date'), NEVER),
+    ), NEVER),
+  }
+
+
+def arrears_queryset(level, as_of, names):
+  model, _ = LEVELS[level]
+  available = figures(level, as_of)
+  return model.objects.annotate(**{name: available[name] for name in names})
+
+
+def arrears_ids(level, as_of, ordering, owing):
+  # Sorted ids of every row, with balance > 0 when `owing`. Filtering here
+  # rather than in SQL, and sorting on the selected column, means each
+  # figure is computed once per row, and the same pass yields the count.
+  name = ordering.lstrip('-')
+  descending = ordering.startswith('-')
+  if name == 'days_overdue':
+    # Most days overdue is the earliest date
+    name, descending = 'overdue_since', not descending
+
+  queryset = arrears_queryset(level, as_of, {name, 'balance'} if owing else {name})
+  expression = F(name).desc(nulls_last=True) if descending else F(name).asc(nulls_last=True)
+  rows = queryset.order_by(expression, 'pk').values_list('pk', 'balance' if owing else name)
+  return [pk for pk, balance in rows if not owing or balance > 0]
+
+
+def arrears_rows(level, as_of, ids):
+  fields = LEVEL_FIELDS[level]
+  queryset = arrears_queryset(level, as_of, MONEY_FIELDS + ('overdue_since',)).filter(pk__in=ids)
+  found = {values['pk']: values for values in queryset.values('pk', *fields.values(), *MONEY_FIELDS, 'overdue_since')}
+
+  rows = []
+  for pk in ids:
+    values = found.get(pk)
+    if values is None:
+      continue
+    row = {name: values[path] for name, path in fields.items()}
+    for name in MONEY_FIELDS:
+      row[name] = str(values[name].quantize(Decimal('0.01')))
+    row['overdue_since'] = values['overdue_since']
+    row['days_overdue'] = (as_of - values['overdue_since']).days if values['overdue_since'] else 0
+    rows.append(row)
+  return rows
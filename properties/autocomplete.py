@@ -0,0 +1,220 @@
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+
+from django.db import close_old_connections
+
+# Search-box suggestions served from memory. Every distinct title, address,
+# city and type name is a term; the index is two sorted lists of
+# (normalized text, term) pairs, one for the whole term and one for the
+# term from each later word onwards, so a prefix is a bisect plus a short
+# forward scan and matches at the start of a term are found first.
+#
+# The index is built from the database on first use and kept current by the
+# Property signals in this process. Rebuilds after that (a new property
+# type) run in a background thread while the old index keeps answering,
+# and the finished index replaces it in one assignment. Writes made by
+# other processes show up at the next rebuild.
+KINDS = ('title', 'address', 'city', 'type')
+# Suggestions can start at any of the first few words of a term
+MAX_WORD_STARTS = 4
+# Matching terms looked at per query before ranking
+SCAN_LIMIT = 200
+
+
+def normalize(value):
+  value = unicodedata.normalize('NFKD', str(value or ''))
+  value = ''.join(char for char in value if not unicodedata.combining(char))
+  value = ''.join(char if char.isalnum() else ' ' for char in value.lower())
+  return ' '.join(value.split())
+
+
+def term_keys(title, address, city, type_name):
+  keys = []
+  for kind, display in zip(KINDS, (title, address, city, type_name)):
+    text = normalize(display)
+    if text:
+      keys.append(((kind, text), display.strip()))
+  return keys
+
+
+def word_starts(text):
+  words = text.split(' ')
+  return [' '.join(words[index:]) for index in range(min(len(words), MAX_WORD_STARTS))]
+
+
+class IndexState:
+  # One complete index. The live one is only changed under PrefixIndex.lock.
+
+  def __init__(self, type_names):
+    self.entries = ([], [])
+    self.terms = {}
+    self.property_terms = {}
+    self.type_names = type_names
+
+  @classmethod
+  def load(cls):
+    from .models import Property, PropertyType
+
+    state = cls(dict(PropertyType.objects.values_list('id', 'name')))
+    rows = Property.objects.values_list('id', 'title', 'address', 'city', 'property_type_id')
+    for property_id, title, address, city, type_id in rows.iterator(chunk_size=2000):
+      keys = term_keys(title, address, city, state.type_names.get(type_id))
+      state.property_terms[property_id] = keys
+      for key, display in keys:
+        state.terms.setdefault(key, [display, set()])[1].add(property_id)
+
+    for key in state.terms:
+      for position, text in enumerate(word_starts(key[1])):
+        state.entries[position > 0].append((text, key))
+    state.entries[0].sort()
+    state.entries[1].sort()
+    return state
+
+  def update(self, property_id, title, address, city, type_id):
+    # False when the type is unknown here and the index needs a rebuild
+    self.remove(property_id)
+    keys = term_keys(title, address, city, self.type_names.get(type_id))
+    self.property_terms[property_id] = keys
+    for key, display in keys:
+      term = self.terms.get(key)
+      if term is None:
+        term = self.terms[key] = [display, set()]
+        for position, text in enumerate(word_starts(key[1])):
+          insort(self.entries[position > 0], (text, key))
+      term[1].add(property_id)
+    return type_id is None or type_id in self.type_names
+
+  def remove(self, property_id):
+    for key, _ in self.property_terms.pop(property_id, ()):
+      term = self.terms.get(key)
+      if term is None:
+        continue
+      term[1].discard(property_id)
+      if not term[1]:
+        del self.terms[key]
+        for position, text in enumerate(word_starts(key[1])):
+          entries = self.entries[position > 0]
+          index = bisect_left(entries, (text, key))
+          if index < len(entries) and entries[index] == (text, key):
+            del entries[index]
+    return True
+
+
+class PrefixIndex:
+
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.build_lock = threading.Lock()
+    self.state = None
+    # Changes seen while a build reads the database, replayed onto its result
+    self.pending = None
+    self.refresh_queued = False
+
+  def reset(self):
+    # Drops the index; the next query builds it again before answering
+    with self.lock:
+      self.state = None
+
+  def refresh(self):
+    with self.lock:
+      if self.state is None or self.refresh_queued:
+        return
+      self.refresh_queued = True
+      if self.pending is None:
+        self.pending = []
+    threading.Thread(target=self.build_in_background, name='property-autocomplete', daemon=True).start()
+
+  def build_in_background(self):
+    close_old_connections()
+    try:
+      with self.build_lock:
+        with self.lock:
+          self.refresh_queued = False
+        self.build()
+    finally:
+      close_old_connections()
+
+  def ensure_built(self):
+    if self.state is None:
+      with self.build_lock:
+        # Another thread may have built it while we waited
+        if self.state is None:
+          self.build()
+
+  def build(self):
+    # Callers hold build_lock. Replaying a change the load already saw is
+    # harmless, so recording starts as early as possible.
+    with self.lock:
+      if self.pending is None:
+        self.pending = []
+    try:
+      state = IndexState.load()
+    except Exception:
+      with self.lock:
+        self.pending = None
+      raise
+
+    complete = True
+    with self.lock:
+      for change, args in self.pending:
+        complete &= getattr(state, change)(*args)
+      self.pending = None
+      self.state = state
+    if not complete:
+      self.refresh()
+
+  def update(self, property_id, title, address, city, type_id):
+    self.apply('update', (property_id, title, address, city, type_id))
+
+  def remove(self, property_id):
+    self.apply('remove', (property_id,))
+
+  def apply(self, change, args):
+    with self.lock:
+      if self.pending is not None:
+        self.pending.append((change, args))
+      if self.state is None:
+        return
+      complete = getattr(self.state, change)(*args)
+    if not complete:
+      self.refresh()
+
+  def suggest(self, query, limit=10):
+    prefix = normalize(query)
+    if not prefix:
+      return []
+    self.ensure_built()
+
+    with self.lock:
+      state = self.state
+      if state is None:
+        return []
+      ranked = []
+      for entries in state.entries:
+        matches = set()
+        index = bisect_left(entries, (prefix,))
+        while index < len(entries) and len(matches) < SCAN_LIMIT:
+          text, key = entries[index]
+          if not text.startswith(prefix):
+            break
+          if key not in ranked:
+            matches.add(key)
+          index += 1
+        # Within each group, terms shared by more properties come first
+        ranked += sorted(matches, key=lambda key: (-len(state.terms[key][1]), len(key[1]), key[1]))
+        if len(ranked) >= limit:
+          break
+
+      suggestions = []
+      for key in ranked[:limit]:
+        kind = key[0]
+        display, property_ids = state.terms[key]
+        suggestion = {'text': display, 'kind': kind, 'count': len(property_ids)}
+        if kind in ('title', 'address') and len(property_ids) == 1:
+          suggestion['property_id'] = next(iter(property_ids))
+        suggestions.append(suggestion)
+    return suggestions
+
+
+prefix_index = PrefixIndex()
@@ -0,0 +1,41 @@
+import datetime
+
+from .models import Agreement
+
+# Booking calendars for rental properties. Bookings are the pending and
+# active agreements; they come back for every requested property in one
+# query on the booking index, and the free ranges are the gaps between
+# them inside the requested window.
+MAX_PROPERTIES = 100
+ONE_DAY = datetime.timedelta(days=1)
+
+
+def booking_calendar(property_ids, start, end):
+  rows = (
+    Agreement.bookings(property_ids, start, end)
+    .order_by('property_id', 'rent_start_date', 'id')
+    .values('id', 'property_id', 'status', 'rent_start_date', 'rent_end_date')
+  )
+  calendar = {property_id: {'property_id': property_id, 'booked': [], 'free': []} for property_id in property_ids}
+  free_from = dict.fromkeys(property_ids, start)
+
+  for row in rows:
+    property_id = row['property_id']
+    calendar[property_id]['booked'].append({
+      'agreement_id': row['id'],
+      'status': row['status'],
+      'start': row['rent_start_date'],
+      'end': row['rent_end_date'],
+    })
+    if row['rent_start_date'] > free_from[property_id]:
+      calendar[property_id]['free'].append({
+        'start': free_from[property_id],
+        'end': row['rent_start_date'] - ONE_DAY,
+      })
+    # Older data may hold overlapping bookings, so never move backwards
+    free_from[property_id] = max(free_from[property_id], row['rent_end_date'] + ONE_DAY)
+
+  for property_id, day in free_from.items():
+    if day <= end:
+      calendar[property_id]['free'].append({'start': day, 'end': end})
+  return list(calendar.values())
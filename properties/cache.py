@@ -0,0 +1,173 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+# Cached responses are keyed on a generation number per model. Saving or
+# deleting any instance of a model bumps its generation, so every cached
+# response that depended on it is simply never looked up again and ages
+# out of the cache on its own. The time of each model's last change is
+# kept next to its generation for Last-Modified headers.
+#
+# Generations only reach other processes through the cache itself, so
+# with more than one worker process (or management commands that change
+# data) PROPERTIES_CACHE_ALIAS has to be a shared backend: file-based on a
+# single host, memcached or redis otherwise. `manage.py check --deploy`
+# warns when it is process-local.
+KEY_PREFIX = 'properties'
+
+
+def get_cache():
+  return caches[getattr(settings, 'PROPERTIES_CACHE_ALIAS', 'default')]
+
+
+def get_timeout():
+  return getattr(settings, 'PROPERTIES_CACHE_TIMEOUT', 300)
+
+
+def generation_key(model_name):
+  return f'{KEY_PREFIX}:generation:{model_name}'
+
+
+def changed_key(model_name):
+  return f'{KEY_PREFIX}:changed:{model_name}'
+
+
+def get_generations(model_names):
+  cache = get_cache()
+  keys = [generation_key(name) for name in model_names]
+  generations = cache.get_many(keys)
+  missing = {key: time.time_ns() for key in keys if key not in generations}
+  if missing:
+    # Seed with a timestamp rather than 0 so an evicted counter can never
+    # roll back to a generation that still has entries cached.
+    for key, value in missing.items():
+      cache.add(key, value, timeout=None)
+    generations.update(cache.get_many(list(missing)))
+  return [generations.get(key, 0) for key in keys]
+
+
+def get_changed_at(model_names):
+  # Seconds since the epoch of each model's last change. An unknown one is
+  # recorded as changed now, which can only make clients download again.
+  cache = get_cache()
+  keys = [changed_key(name) for name in model_names]
+  changed = cache.get_many(keys)
+  missing = [key for key in keys if key not in changed]
+  if missing:
+    now = time.time()
+    for key in missing:
+      cache.add(key, now, timeout=None)
+    changed.update(cache.get_many(missing))
+  return [changed.get(key, 0) for key in keys]
+
+
+def bump_generation(model_name):
+  cache = get_cache()
+  key = generation_key(model_name)
+  # add() seeds a missing counter and incr() is atomic, so two concurrent
+  # changes never end up on the same generation
+  if not cache.add(key, time.time_ns(), timeout=None):
+    try:
+      cache.incr(key)
+    except ValueError:
+      # Evicted since add(); a new timestamp is past every old generation
+      cache.add(key, time.time_ns(), timeout=None)
+  cache.set(changed_key(model_name), time.time(), timeout=None)
+
+
+def invalidate_generation(model_name, using=None):
+  # Bump now so this connection stops using old entries, and again once
+  # the change is visible to other connections, otherwise a concurrent read
+  # could re-cache the old data under the new generation.
+  bump_generation(model_name)
+  if transaction.get_connection(using).in_atomic_block:
+    transaction.on_commit(lambda: bump_generation(model_name), using=using)
+
+
+def increment_counter(name):
+  cache = get_cache()
+  key = f'{KEY_PREFIX}:counter:{name}'
+  if not cache.add(key, 1, timeout=None):
+    try:
+      cache.incr(key)
+    except ValueError:
+      cache.set(key, 1, timeout=None)
+
+
+def get_counters():
+  cache = get_cache()
+  names = ['hits', 'misses']
+  values = cache.get_many([f'{KEY_PREFIX}:counter:{name}' for name in names])
+  return {name: values.get(f'{KEY_PREFIX}:counter:{name}', 0) for name in names}
+
+
+class CachedResponseMixin:
+  """
+  Caches list/retrieve responses of a viewset, keyed on the normalized
+  query string and the generations of `cache_models`.
+
+  The ETag and Last-Modified of a cached response are stored with it, so
+  placed before ConditionalGetMixin a hit answers conditional requests
+  without touching the database.
+  """
+  cache_models = ()
+
+  def get_response_cache_key(self, request, ignored_params=()):
+    params = sorted(
+      (key, value)
+      for key, values in request.query_params.lists()
+      for value in values
+      if value != '' and key not in ignored_params
+    )
+    raw = repr((
+      request.get_host(),
+      self.action,
+      sorted(self.kwargs.items()),
+      params,
+      get_generations(self.cache_models),
+    ))
+    digest = hashlib.md5(raw.encode('utf-8')).hexdigest()
+    return f'{KEY_PREFIX}:entry:{self.basename}:{digest}'
+
+  def cached_response(self, request, render, timeout=None, ignored_params=()):
+    cache = get_cache()
+    key = self.get_response_cache_key(request, ignored_params)
+    entry = cache.get(key)
+    if entry is not None:
+      increment_counter('hits')
+      etag = entry['etag']
+      last_modified = parse_http_date_safe(entry['last_modified']) if entry['last_modified'] else None
+      response = None
+      if etag or last_modified:
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+      if response is None:
+        response = Response(entry['data'])
+      if etag:
+        response['ETag'] = etag
+      if last_modified:
+        response['Last-Modified'] = entry['last_modified']
+      response['X-Cache'] = 'HIT'
+      return response
+
+    increment_counter('misses')
+    response = render()
+    if response.status_code == 200:
+      cache.set(key, {
+        'data': response.data,
+        'etag': response.get('ETag'),
+        'last_modified': response.get('Last-Modified'),
+      }, timeout=timeout or get_timeout())
+    response['X-Cache'] = 'MISS'
+    return response
+
+  def list(self, request, *args, **kwargs):
+    return self.cached_response(request, lambda: super(CachedResponseMixin, self).list(request, *args, **kwargs))
+
+  def retrieve(self, request, *args, **kwargs):
+    return self.cached_response(request, lambda: super(CachedResponseMixin, self).retrieve(request, *args, **kwargs))
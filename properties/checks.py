@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Tags, Warning, register
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+  # Cache generations are how one process tells the others that cached
+  # responses are stale (see properties/cache.py)
+  alias = getattr(settings, 'PROPERTIES_CACHE_ALIAS', 'default')
+  if isinstance(caches[alias], LocMemCache):
+    return [Warning(
+      f"PROPERTIES_CACHE_ALIAS '{alias}' uses the local-memory cache, so changes made in one "
+      "process never invalidate responses cached by another.",
+      hint="Use a shared backend (file-based, memcached or redis) when running more than one "
+           "worker process.",
+      id='properties.W001',
+    )]
+  return []
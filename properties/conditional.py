@@ -0,0 +1,69 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from .cache import get_changed_at, get_generations
+
+
+class ConditionalGetMixin:
+  """
+  Adds ETag/Last-Modified to list and retrieve responses and answers
+  If-None-Match/If-Modified-Since with 304 before anything is serialized.
+
+  Validators come from COUNT(*) and MAX(updated_at) of the filtered
+  queryset, plus the change generations of `cache_models` so edits to
+  nested data (images, customers, ...) are noticed as well.
+  """
+  cache_models = ()
+
+  def get_validators(self, count, last_updated):
+    request = self.request
+    generations = get_generations(self.cache_models)
+    raw = repr((
+      getattr(request.user, 'pk', None),
+      request.get_full_path(),
+      count,
+      last_updated.isoformat() if last_updated else None,
+      generations,
+    ))
+    etag = quote_etag(hashlib.md5(raw.encode('utf-8')).hexdigest())
+
+    timestamps = [last_updated.timestamp()] if last_updated else []
+    timestamps += get_changed_at(self.cache_models)
+    last_modified = int(max(timestamps)) if timestamps else None
+    return etag, last_modified
+
+  def conditional_response(self, request, etag, last_modified, render):
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+      response = render()
+    if 200 <= response.status_code < 300 or response.status_code == 304:
+      response['ETag'] = etag
+      if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
+
+  def get_queryset_validators(self, queryset):
+    stats = queryset.order_by().aggregate(count=Count('pk'), last_updated=Max('updated_at'))
+    return self.get_validators(stats['count'], stats['last_updated'])
+
+  def list(self, request, *args, **kwargs):
+    queryset = self.filter_queryset(self.get_queryset())
+    etag, last_modified = self.get_queryset_validators(queryset)
+    return self.conditional_response(
+      request, etag, last_modified,
+      lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs)
+    )
+
+  def retrieve(self, request, *args, **kwargs):
+    # Serializes the instance the validators came from, as
+    # RetrieveModelMixin would, instead of looking it up a second time
+    instance = self.get_object()
+    etag, last_modified = self.get_validators(1, instance.updated_at)
+    return self.conditional_response(
+      request, etag, last_modified,
+      lambda: Response(self.get_serializer(instance).data)
+    )
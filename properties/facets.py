@@ -0,0 +1,63 @@
+from collections import defaultdict
+
+from django.db.models import Count
+
+# Facet counts for the search sidebar. The filtered queryset is grouped once
+# on every facet column together; the per-facet counts are then rolled up
+# from those combinations in Python, so the database is hit exactly once no
+# matter how many facets or values there are.
+FACET_COLUMNS = (
+  'property_category_id', 'property_category__name',
+  'property_type_id', 'property_type__name',
+  'city', 'rent_or_buy', 'bedroom',
+)
+
+# Parameters that page or order the list but do not change the counts
+IGNORED_PARAMS = ('page', 'page_size', 'pagination', 'cursor', 'ordering', 'export_format')
+
+
+def by_count(items, label):
+  return sorted(items, key=lambda item: (-item['count'], str(item[label])))
+
+
+def facet_counts(queryset):
+  rows = (
+    queryset
+    .prefetch_related(None)
+    .order_by()
+    .values(*FACET_COLUMNS)
+    .annotate(count=Count('id'))
+  )
+
+  total = 0
+  categories = defaultdict(int)
+  types = defaultdict(int)
+  cities = defaultdict(int)
+  rent_or_buy = defaultdict(int)
+  bedrooms = defaultdict(int)
+  for row in rows:
+    count = row['count']
+    total += count
+    if row['property_category_id'] is not None:
+      categories[row['property_category_id'], row['property_category__name']] += count
+    if row['property_type_id'] is not None:
+      types[row['property_type_id'], row['property_type__name'], row['property_category_id']] += count
+    cities[row['city']] += count
+    rent_or_buy[row['rent_or_buy']] += count
+    if row['bedroom'] is not None:
+      bedrooms[row['bedroom']] += count
+
+  return {
+    'total': total,
+    'category': by_count([
+      {'id': id, 'name': name, 'count': count}
+      for (id, name), count in categories.items()
+    ], 'name'),
+    'type': by_count([
+      {'id': id, 'name': name, 'category_id': category_id, 'count': count}
+      for (id, name, category_id), count in types.items()
+    ], 'name'),
+    'city': by_count([{'value': value, 'count': count} for value, count in cities.items()], 'value'),
+    'rent_or_buy': by_count([{'value': value, 'count': count} for value, count in rent_or_buy.items()], 'value'),
+    'bedroom': [{'value': value, 'count': bedrooms[value]} for value in sorted(bedrooms)],
+  }
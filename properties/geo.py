@@ -0,0 +1,135 @@
+import math
+
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import ASin, Cast, Cos, Power, Radians, Sin, Sqrt
+
+# Geohash-based spatial lookups that work on plain SQLite. Each property
+# stores the geohash of its coordinates in an indexed column; an area query
+# is first turned into the handful of geohash cells covering it, which the
+# index can answer as prefix ranges, and only the surviving rows get the
+# exact distance/box test.
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+PRECISION = 12
+EARTH_RADIUS_KM = 6371.0088
+MAX_COVER_CELLS = 32
+
+
+def encode(latitude, longitude, precision=PRECISION):
+  lat_range = [-90.0, 90.0]
+  lng_range = [-180.0, 180.0]
+  chars = []
+  bits = 0
+  bit_count = 0
+  even = True
+  while len(chars) < precision:
+    target, value = (lng_range, longitude) if even else (lat_range, latitude)
+    middle = (target[0] + target[1]) / 2
+    bits <<= 1
+    if value >= middle:
+      bits |= 1
+      target[0] = middle
+    else:
+      target[1] = middle
+    even = not even
+    bit_count += 1
+    if bit_count == 5:
+      chars.append(BASE32[bits])
+      bits = 0
+      bit_count = 0
+  return ''.join(chars)
+
+
+def cell_size(precision):
+  # (latitude span, longitude span) of one cell in degrees
+  total_bits = precision * 5
+  lng_bits = (total_bits + 1) // 2
+  lat_bits = total_bits // 2
+  return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lng_bits)
+
+
+def cover(min_lat, min_lng, max_lat, max_lng, max_cells=MAX_COVER_CELLS):
+  """
+  Geohash prefixes whose cells together cover the box, using the finest
+  precision that needs at most `max_cells` of them.
+  """
+  min_lat, max_lat = max(min_lat, -90.0), min(max_lat, 90.0)
+  min_lng, max_lng = max(min_lng, -180.0), min(max_lng, 180.0)
+
+  for precision in range(PRECISION, 0, -1):
+    lat_step, lng_step = cell_size(precision)
+    rows = math.floor(max_lat / lat_step) - math.floor(min_lat / lat_step) + 1
+    columns = math.floor(max_lng / lng_step) - math.floor(min_lng / lng_step) + 1
+    if rows * columns <= max_cells:
+      break
+
+  cells = set()
+  for row in range(rows):
+    latitude = min(min_lat + row * lat_step, max_lat)
+    for column in range(columns):
+      longitude = min(min_lng + column * lng_step, max_lng)
+      cells.add(encode(latitude, longitude, precision))
+    cells.add(encode(latitude, max_lng, precision))
+  for column in range(columns):
+    cells.add(encode(max_lat, min(min_lng + column * lng_step, max_lng), precision))
+  cells.add(encode(max_lat, max_lng, precision))
+  return sorted(cells)
+
+
+def cover_filter(cells, field='geohash'):
+  # Prefix ranges rather than LIKE so SQLite always uses the index
+  condition = Q()
+  for cell in cells:
+    condition |= Q(**{f'{field}__gte': cell, f'{field}__lt': cell + '~'})
+  return condition
+
+
+def wrap_longitude(longitude):
+  if -180.0 <= longitude <= 180.0:
+    return longitude
+  return (longitude + 180.0) % 360.0 - 180.0
+
+
+def split_box(min_lat, min_lng, max_lat, max_lng):
+  """
+  The box as one or two boxes within -180..180 longitude. A box crossing the
+  antimeridian, given with longitudes past ±180 or with min_lng > max_lng
+  as in GeoJSON, is split into its eastern and western parts.
+  """
+  if max_lng - min_lng >= 360.0:
+    return [(min_lat, -180.0, max_lat, 180.0)]
+  min_lng, max_lng = wrap_longitude(min_lng), wrap_longitude(max_lng)
+  if min_lng <= max_lng:
+    return [(min_lat, min_lng, max_lat, max_lng)]
+  return [(min_lat, min_lng, max_lat, 180.0), (min_lat, -180.0, max_lat, max_lng)]
+
+
+def box_filter(min_lat, min_lng, max_lat, max_lng, lat_field='latitude', lng_field='longitude'):
+  # The covering cells of every part go into one indexed OR, the exact
+  # coordinate test is checked on what it returns
+  cells = set()
+  exact = Q()
+  for south, west, north, east in split_box(min_lat, min_lng, max_lat, max_lng):
+    cells.update(cover(south, west, north, east))
+    exact |= Q(**{f'{lat_field}__range': (south, north), f'{lng_field}__range': (west, east)})
+  return cover_filter(sorted(cells)) & exact
+
+
+def radius_box(latitude, longitude, radius_km):
+  # Longitudes may run past ±180 near the antimeridian; split_box() wraps them
+  lat_delta = math.degrees(radius_km / EARTH_RADIUS_KM)
+  cos_lat = math.cos(math.radians(latitude))
+  lng_delta = 180.0 if cos_lat < 1e-9 else min(180.0, lat_delta / cos_lat)
+  return latitude - lat_delta, longitude - lng_delta, latitude + lat_delta, longitude + lng_delta
+
+
+def distance_expression(latitude, longitude, lat_field='latitude', lng_field='longitude'):
+  # Haversine distance in km; Django provides these functions on SQLite
+  lat1 = Value(math.radians(latitude), output_field=FloatField())
+  lng1 = Value(math.radians(longitude), output_field=FloatField())
+  lat2 = Radians(Cast(F(lat_field), FloatField()))
+  lng2 = Radians(Cast(F(lng_field), FloatField()))
+  a = (
+    Power(Sin((lat2 - lat1) / 2), 2)
+    + Cos(lat1) * Cos(lat2) * Power(Sin((lng2 - lng1) / 2), 2)
+  )
+  return Value(2 * EARTH_RADIUS_KM, output_field=FloatField()) * ASin(Sqrt(a))
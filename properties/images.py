@@ -0,0 +1,124 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps
+
+from .models import PropertyImage
+
+logger = logging.getLogger(__name__)
+
+# Listing pages should not pull multi-megabyte originals, so every uploaded
+# PropertyImage gets resized WebP/JPEG copies. They are generated on a small
+# thread pool after the upload commits; `manage.py generate_image_variants`
+# picks up anything left pending (e.g. after a restart).
+FORMATS = {
+  'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+  'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+_executor = None
+
+
+def get_widths():
+  return getattr(settings, 'PROPERTY_IMAGE_VARIANT_WIDTHS', (320, 640, 1280))
+
+
+def get_executor():
+  global _executor
+  if _executor is None:
+    _executor = ThreadPoolExecutor(
+      max_workers=getattr(settings, 'PROPERTY_IMAGE_VARIANT_WORKERS', 2),
+      thread_name_prefix='property-image-variants'
+    )
+  return _executor
+
+
+def schedule_variants(image_id, using=None):
+  if getattr(settings, 'PROPERTY_IMAGE_VARIANTS_ASYNC', True):
+    transaction.on_commit(lambda: get_executor().submit(run_in_background, image_id), using=using)
+  else:
+    transaction.on_commit(lambda: generate_variants(image_id), using=using)
+
+
+def run_in_background(image_id):
+  close_old_connections()
+  try:
+    generate_variants(image_id)
+  finally:
+    close_old_connections()
+
+
+def generate_variants(image_id):
+  property_image = PropertyImage.objects.filter(pk=image_id).first()
+  if property_image is None:
+    return
+  if not property_image.image:
+    property_image.variants_status = 'ready'
+    property_image.save(update_fields=['variants_status'])
+    return
+
+  try:
+    storage = property_image.image.storage
+    with property_image.image.open('rb') as source:
+      original = ImageOps.exif_transpose(Image.open(source))
+      original.load()
+
+    stem = os.path.splitext(os.path.basename(property_image.image.name))[0]
+    variants = {}
+    for width in sorted(get_widths()):
+      # Never upscale; the largest variant is at most the original size
+      resized = original.copy()
+      resized.thumbnail((width, width * 10), Image.LANCZOS)
+      for key, (pil_format, extension, options) in FORMATS.items():
+        frame = resized
+        if pil_format == 'JPEG' and frame.mode not in ('RGB', 'L'):
+          frame = frame.convert('RGB')
+        buffer = BytesIO()
+        frame.save(buffer, pil_format, **options)
+        name = storage.save(
+          f'properties/variants/{stem}_{resized.width}w.{extension}',
+          ContentFile(buffer.getvalue())
+        )
+        variants.setdefault(key, {})[str(resized.width)] = name
+      if resized.width >= original.width:
+        break
+  except Exception:
+    logger.exception("Generating variants for PropertyImage %s failed", image_id)
+    property_image.variants_status = 'failed'
+    property_image.save(update_fields=['variants_status'])
+    return
+
+  previous = property_image.variants
+  property_image.variants = variants
+  property_image.variants_status = 'ready'
+  property_image.save(update_fields=['variants', 'variants_status'])
+  # Regenerating replaces the old files; unchanged ones were just saved
+  # again, so deleting drops that extra reference rather than the file
+  delete_variants(storage, previous)
+
+
+def delete_variants(storage, variants):
+  for widths in (variants or {}).values():
+    for name in widths.values():
+      storage.delete(name)
+
+
+def get_srcset(property_image, request=None):
+  storage = property_image.image.storage
+
+  def url(name):
+    # Absolute like the serialized image field when there is a request
+    return request.build_absolute_uri(storage.url(name)) if request is not None else storage.url(name)
+
+  return {
+    key: ', '.join(
+      f'{url(name)} {width}w'
+      for width, name in sorted(widths.items(), key=lambda item: int(item[0]))
+    )
+    for key, widths in (property_image.variants or {}).items()
+  }
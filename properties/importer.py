@@ -0,0 +1,190 @@
+import csv
+import io
+import json
+
+from django.db import transaction
+from rest_framework import serializers
+
+from .autocomplete import prefix_index
+from .cache import invalidate_generation
+from .models import DashboardCounters, Property, PropertyCategory, PropertyType
+from .search import index_properties
+from .serializers import PropertySerializer
+
+FORMATS = ('csv', 'ndjson')
+
+
+def detect_format(filename, default='csv'):
+  name = (filename or '').lower()
+  if name.endswith(('.ndjson', '.jsonl')):
+    return 'ndjson'
+  if name.endswith('.csv'):
+    return 'csv'
+  return default
+
+
+def normalize_header(name):
+  # Spreadsheet exports add stray spaces and capitals, and a text stream
+  # opened without utf-8-sig keeps the BOM on the first column
+  return name.lstrip('\ufeff').strip().lower().replace(' ', '_') if name else name
+
+
+def iter_rows(stream, file_format):
+  """
+  Yields (row number, dict) from a binary or text stream without reading
+  it into memory. Empty CSV cells are treated as missing values.
+  """
+  if isinstance(stream, (io.TextIOBase, io.StringIO)):
+    text = stream
+  else:
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+  if file_format == 'csv':
+    reader = csv.DictReader(text)
+    if reader.fieldnames:
+      reader.fieldnames = [normalize_header(name) for name in reader.fieldnames]
+    for number, row in enumerate(reader, start=2):
+      yield number, {key: value for key, value in row.items() if key and value not in ('', None)}
+  elif file_format == 'ndjson':
+    for number, line in enumerate(text, start=1):
+      line = line.strip()
+      if not line:
+        continue
+      try:
+        row = json.loads(line)
+      except ValueError as error:
+        yield number, error
+        continue
+      yield number, row if isinstance(row, dict) else ValueError('Each line must be a JSON object')
+  else:
+    raise ValueError(f"Unsupported format: {file_format}")
+
+
+class PropertyImporter:
+  """
+  Validates rows with the PropertySerializer field rules and inserts them
+  with bulk_create, one transaction per batch. Category and type names are
+  resolved from an in-memory map instead of a query per row. Row errors
+  are collected (up to `max_errors`) and never abort the import.
+  """
+
+  def __init__(self, batch_size=500, max_errors=1000):
+    self.batch_size = batch_size
+    self.max_errors = max_errors
+    self.created = 0
+    self.failed = 0
+    self.errors = []
+
+    self.categories = {}
+    for category_id, name in PropertyCategory.objects.values_list('id', 'name'):
+      self.categories[name.strip().lower()] = category_id
+      self.categories[str(category_id)] = category_id
+
+    self.types = {}
+    self.type_categories = {}
+    for type_id, category_id, name in PropertyType.objects.values_list('id', 'category_id', 'name'):
+      key = name.strip().lower()
+      self.types[(category_id, key)] = type_id
+      # A bare type name resolves only if it is unique across categories
+      self.types[(None, key)] = None if (None, key) in self.types else type_id
+      self.types[(None, str(type_id))] = type_id
+      self.type_categories[type_id] = category_id
+
+    # Bound once and reused; relations are resolved above, not by the serializer
+    self.serializer = PropertySerializer()
+
+  def run(self, rows):
+    batch = []
+    for number, row in rows:
+      instance = self.build(number, row)
+      if instance is not None:
+        batch.append(instance)
+      if len(batch) >= self.batch_size:
+        self.flush(batch)
+        batch = []
+    if batch:
+      self.flush(batch)
+    if self.created:
+      invalidate_generation('property')
+    return self.summary()
+
+  def summary(self):
+    return {
+      'created': self.created,
+      'failed': self.failed,
+      'errors': self.errors,
+      'errors_truncated': self.failed > len(self.errors),
+    }
+
+  def add_error(self, number, detail):
+    self.failed += 1
+    if len(self.errors) < self.max_errors:
+      self.errors.append({'row': number, 'errors': detail})
+
+  def resolve_relations(self, row):
+    errors = {}
+    category_value = row.pop('category', None) or row.pop('property_category', None)
+    type_value = row.pop('type', None) or row.pop('property_type', None)
+    row.pop('property_category', None)
+    row.pop('property_type', None)
+
+    category_id = None
+    if category_value is not None:
+      category_id = self.categories.get(str(category_value).strip().lower())
+      if category_id is None:
+        errors['category'] = [f'Unknown category "{category_value}".']
+
+    type_id = None
+    if type_value is not None:
+      key = str(type_value).strip().lower()
+      type_id = self.types.get((category_id, key)) or self.types.get((None, key))
+      if type_id is None:
+        errors['type'] = [f'Unknown or ambiguous type "{type_value}".']
+      elif category_id is None:
+        category_id = self.type_categories[type_id]
+      elif self.type_categories[type_id] != category_id:
+        errors['type'] = [f'Type "{type_value}" does not belong to the given category.']
+    return category_id, type_id, errors
+
+  def build(self, number, row):
+    if isinstance(row, Exception):
+      self.add_error(number, {'non_field_errors': [str(row)]})
+      return None
+
+    row = dict(row)
+    row.pop('id', None)
+    row.pop('uploaded_images', None)
+    category_id, type_id, errors = self.resolve_relations(row)
+    try:
+      validated = self.serializer.run_validation(row)
+    except serializers.ValidationError as error:
+      detail = error.detail if isinstance(error.detail, dict) else {'non_field_errors': error.detail}
+      errors = {**detail, **errors}
+    if errors:
+      self.add_error(number, errors)
+      return None
+
+    validated.pop('uploaded_images', None)
+    instance = Property(property_category_id=category_id, property_type_id=type_id, **validated)
+    instance.availability = instance.compute_availability()
+    instance.geohash = instance.compute_geohash()
+    return instance
+
+  def flush(self, batch):
+    with transaction.atomic():
+      created = Property.objects.bulk_create(batch)
+      # bulk_create skips post_save, so keep the search indexes in step here
+      index_properties(created)
+      counts = {}
+      for instance in created:
+        for field, value in DashboardCounters.property_counts(instance.availability, instance.status).items():
+          counts[field] = counts.get(field, 0) + value
+      DashboardCounters.apply(new=counts)
+      transaction.on_commit(lambda: self.update_autocomplete(created))
+    self.created += len(created)
+
+  def update_autocomplete(self, created):
+    for instance in created:
+      prefix_index.update(
+        instance.pk, instance.title, instance.address, instance.city, instance.property_type_id
+      )
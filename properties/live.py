@@ -0,0 +1,172 @@
+import asyncio
+import json
+import logging
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import JsonResponse, StreamingHttpResponse
+
+logger = logging.getLogger(__name__)
+
+# Live admin dashboard over server-sent events. Signal handlers publish
+# events after their transaction commits; the broker fans each event out to
+# the queue of every connected admin in this process, so a change costs no
+# queries per listener. Changes made by other processes are picked up by a
+# single watcher per process that re-reads the counters row every
+# LIVE_DASHBOARD_POLL_INTERVAL seconds and sends a fresh snapshot when it
+# moved.
+QUEUE_SIZE = 100
+KEEPALIVE_SECONDS = 15
+# EventSource cannot send headers, so browsers POST dashboard/events/ticket/
+# and open the stream with ?ticket=. A ticket is signed for this one purpose,
+# names the admin and expires after TICKET_MAX_AGE seconds; a client whose
+# stream drops asks for a new one before reconnecting.
+TICKET_MAX_AGE = 30
+TICKET_SALT = 'properties.live.dashboard-events'
+
+
+class Broker:
+
+  def __init__(self):
+    self.lock = threading.Lock()
+    self.subscribers = set()
+    self.watcher = None
+    self.last_counters = None
+
+  def subscribe(self):
+    subscriber = (asyncio.get_running_loop(), asyncio.Queue(maxsize=QUEUE_SIZE))
+    with self.lock:
+      self.subscribers.add(subscriber)
+      if self.watcher is None or self.watcher.done():
+        self.watcher = subscriber[0].create_task(self.watch())
+    return subscriber
+
+  def has_subscribers(self):
+    return bool(self.subscribers)
+
+  def unsubscribe(self, subscriber):
+    with self.lock:
+      self.subscribers.discard(subscriber)
+      if not self.subscribers and self.watcher is not None:
+        self.watcher.cancel()
+        self.watcher = None
+
+  def publish(self, event, data):
+    # Safe to call from any thread; never blocks the publisher
+    with self.lock:
+      subscribers = list(self.subscribers)
+    for loop, queue in subscribers:
+      try:
+        loop.call_soon_threadsafe(self.deliver, queue, event, data)
+      except RuntimeError:
+        # The subscriber's loop has closed
+        self.unsubscribe((loop, queue))
+
+  def deliver(self, queue, event, data):
+    if queue.full():
+      # A client this far behind gets a fresh snapshot instead of the backlog
+      while not queue.empty():
+        queue.get_nowait()
+      event, data = 'resync', {}
+    queue.put_nowait((event, data))
+
+  async def watch(self):
+    from .models import DashboardCounters
+
+    interval = getattr(settings, 'LIVE_DASHBOARD_POLL_INTERVAL', 5)
+    if not interval:
+      return
+    while True:
+      await asyncio.sleep(interval)
+      try:
+        counters = await sync_to_async(DashboardCounters.current)()
+      except Exception:
+        logger.exception("Could not read dashboard counters")
+        continue
+      if counters != self.last_counters:
+        self.last_counters = counters
+        self.publish('stats', counters)
+
+
+broker = Broker()
+
+
+def publish_on_commit(event, data, using=None):
+  transaction.on_commit(lambda: broker.publish(event, data), using=using)
+
+
+def format_event(event, data):
+  return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+def issue_ticket(user):
+  return signing.dumps({'user': user.pk}, salt=TICKET_SALT)
+
+
+def read_ticket(ticket, max_age=TICKET_MAX_AGE):
+  # The user id of a valid, unexpired ticket, otherwise None
+  try:
+    return signing.loads(ticket, salt=TICKET_SALT, max_age=max_age)['user']
+  except (signing.BadSignature, KeyError, TypeError):
+    return None
+
+
+def authenticate_admin(request):
+  # Imported here because models.py imports this module
+  from django.contrib.auth import get_user_model
+  from rest_framework.exceptions import AuthenticationFailed
+  from rest_framework_simplejwt.authentication import JWTAuthentication
+  from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+  authentication = JWTAuthentication()
+  header = authentication.get_header(request)
+  raw_token = authentication.get_raw_token(header) if header else None
+  if raw_token:
+    try:
+      user = authentication.get_user(authentication.get_validated_token(raw_token))
+    except (InvalidToken, TokenError, AuthenticationFailed):
+      return None
+  else:
+    user_id = read_ticket(request.GET.get('ticket', ''))
+    user = get_user_model().objects.filter(pk=user_id).first() if user_id is not None else None
+  return user if user is not None and user.is_active and user.is_admin else None
+
+
+async def event_stream():
+  from .models import DashboardCounters
+
+  # Subscribe before reading the snapshot so no change falls in between
+  subscriber = broker.subscribe()
+  queue = subscriber[1]
+  try:
+    snapshot = await sync_to_async(DashboardCounters.current)()
+    yield f"retry: 3000\n{format_event('stats', snapshot)}"
+    while True:
+      try:
+        event, data = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+      except asyncio.TimeoutError:
+        yield ": keepalive\n\n"
+        continue
+      yield format_event(event, data)
+  finally:
+    broker.unsubscribe(subscriber)
+
+
+async def dashboard_events(request):
+  if not isinstance(request, ASGIRequest):
+    # WSGI would buffer the endless stream instead of sending it
+    return JsonResponse({'detail': 'Live events need the ASGI application (real_estate_server.asgi).'}, status=501)
+
+  user = await sync_to_async(authenticate_admin)(request)
+  if user is None:
+    return JsonResponse({'detail': 'Admin credentials were not provided or are invalid.'}, status=401)
+
+  response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+  response['Cache-Control'] = 'no-cache'
+  response['X-Accel-Buffering'] = 'no'
+  return response
@@ -0,0 +1,131 @@
+import datetime
+import threading
+import time
+import uuid
+from collections import Counter
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+
+from account.models import User
+from properties.models import Agreement, Customer, Property, PropertyCategory, PropertyType
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure agreement transition throughput under concurrency. Creates throwaway "
+        "properties with several agreements each, then has worker threads approve, "
+        "activate and complete them all at once, and checks that no property ended up "
+        "with two active agreements. Everything it creates is deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--properties', type=int, default=20)
+        parser.add_argument('--agreements', type=int, default=5, help='Agreements per property')
+        parser.add_argument('--threads', type=int, default=8)
+
+    def handle(self, *args, **options):
+        if options['properties'] < 1 or options['agreements'] < 1 or options['threads'] < 1:
+            raise CommandError("--properties, --agreements and --threads must be positive.")
+
+        self.tag = uuid.uuid4().hex[:8]
+        category, user = self.create_data(options['properties'], options['agreements'])
+        try:
+            agreements = list(
+                Agreement.objects.filter(customer__user=user).order_by('rent_start_date', 'property_id')
+                .values_list('pk', 'property_id')
+            )
+            self.run_phase('approve', agreements, options['threads'])
+            # Every agreement of a property races to become the active one
+            self.run_phase('activate', agreements, options['threads'])
+
+            active = Counter(
+                Agreement.objects.filter(customer__user=user, status='active')
+                .values_list('property_id', flat=True)
+            )
+            if any(count > 1 for count in active.values()):
+                raise CommandError("A property ended up with more than one active agreement.")
+            self.stdout.write(f"{len(active)} of {options['properties']} properties have exactly one active agreement.")
+
+            self.run_phase('complete', list(
+                Agreement.objects.filter(customer__user=user, status='active').values_list('pk', 'property_id')
+            ), options['threads'])
+        finally:
+            Property.objects.filter(property_category=category).delete()
+            Customer.objects.filter(user=user).delete()
+            user.delete()
+            category.delete()
+
+    def create_data(self, property_count, agreement_count):
+        category = PropertyCategory.objects.create(name=f'Benchmark {self.tag}')
+        property_type = PropertyType.objects.create(name=f'Benchmark {self.tag}', category=category)
+        user = User.objects.create_user(email=f'benchmark-{self.tag}@example.com', name='Benchmark', password=None)
+        customer = Customer.objects.create(
+            user=user, cnic=f'bench-{self.tag}', phone_number=f'b-{self.tag}', address='Benchmark'
+        )
+        start = datetime.date(2000, 1, 1)
+        for index in range(property_count):
+            property_instance = Property.objects.create(
+                title=f'Benchmark {self.tag} {index}', description='Benchmark', price=Decimal('1000'),
+                address='Benchmark', city='Benchmark', rent_or_buy='rent',
+                property_category=category, property_type=property_type,
+            )
+            # Back to back rent periods, so only the single active slot is contended
+            for year in range(agreement_count):
+                Agreement.objects.create(
+                    property=property_instance, customer=customer, rent_amount=Decimal('100'),
+                    rent_start_date=start.replace(year=start.year + year),
+                    rent_end_date=start.replace(year=start.year + year, month=12, day=31),
+                )
+        return category, user
+
+    def run_phase(self, action, agreements, thread_count):
+        queue = list(agreements)
+        lock = threading.Lock()
+        results = Counter()
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        if not queue:
+                            return
+                        pk, property_id = queue.pop()
+                    outcome = self.transition(pk, property_id, action)
+                    with lock:
+                        results.update(outcome)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(thread_count)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        attempts = results['done'] + results['rejected']
+        self.stdout.write(self.style.SUCCESS(
+            f"{action}: {results['done']} done, {results['rejected']} rejected, "
+            f"{results['retried']} retried on lock errors in {elapsed:.2f}s "
+            f"({attempts / elapsed if elapsed else 0:.0f} transitions/s, {thread_count} threads)"
+        ))
+
+    def transition(self, pk, property_id, action):
+        outcome = Counter()
+        while True:
+            try:
+                Agreement(pk=pk, property_id=property_id).transition(action)
+                outcome['done'] += 1
+                return outcome
+            except ValidationError:
+                outcome['rejected'] += 1
+                return outcome
+            except OperationalError:
+                # SQLite has no row locks; a losing writer fails and retries
+                outcome['retried'] += 1
+                time.sleep(0.001)
+
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from properties.images import generate_variants
+from properties.models import PropertyImage
+
+
+class Command(BaseCommand):
+    help = "Generate resized variants for property images that don't have them yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Regenerate variants for every image, not only pending or failed ones',
+        )
+
+    def handle(self, *args, **options):
+        images = PropertyImage.objects.all()
+        if not options['all']:
+            images = images.exclude(variants_status='ready')
+
+        count = 0
+        for image_id in images.values_list('id', flat=True).iterator():
+            generate_variants(image_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Variants generated for {count} images."))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from properties.schedules import RentScheduler
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the pending monthly payments of active rent agreements. "
+        "Agreements whose schedule is already complete are skipped, so it is safe to run nightly."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--agreement', type=int, action='append', dest='agreements', help='Only this agreement; repeatable')
+        parser.add_argument('--batch-size', type=int, default=500, help='Agreements per transaction')
+
+    def handle(self, *args, **options):
+        summary = RentScheduler(batch_size=options['batch_size']).run(options['agreements'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['payments']} payments created, {summary['updated']} updated and "
+            f"{summary['removed']} removed for {summary['agreements']} agreements."
+        ))
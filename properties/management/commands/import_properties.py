@@ -0,0 +1,39 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from properties.importer import FORMATS, PropertyImporter, detect_format, iter_rows
+
+
+class Command(BaseCommand):
+    help = "Bulk import properties from a CSV or NDJSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or NDJSON file, or - for stdin')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--max-errors', type=int, default=1000, help='Row errors to report')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or detect_format(path)
+        importer = PropertyImporter(
+            batch_size=options['batch_size'],
+            max_errors=options['max_errors'],
+        )
+
+        try:
+            if path == '-':
+                summary = importer.run(iter_rows(sys.stdin.buffer, file_format))
+            else:
+                with open(path, 'rb') as stream:
+                    summary = importer.run(iter_rows(stream, file_format))
+        except (OSError, ValueError) as error:
+            raise CommandError(str(error))
+
+        for error in summary['errors']:
+            self.stderr.write(f"Row {error['row']}: {json.dumps(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['created']} properties imported, {summary['failed']} rows failed."
+        ))
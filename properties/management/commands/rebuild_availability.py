@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db.models.functions import Now
+
+from properties.models import DashboardCounters, Property
+from properties.cache import bump_generation
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized availability of every property from its agreements"
+
+    def handle(self, *args, **kwargs):
+        updated = Property.objects.exclude(
+            availability=Property.availability_expression()
+        ).update(
+            availability=Property.availability_expression(),
+            updated_at=Now()
+        )
+        if updated:
+            bump_generation('property')
+        # The bulk update bypasses the signals that keep the counters current
+        DashboardCounters.reconcile()
+        self.stdout.write(self.style.SUCCESS(f"{updated} properties updated."))
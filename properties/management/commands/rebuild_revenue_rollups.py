@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from properties import rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the monthly payment and utility bill rollups from history. "
+        "Source rows are streamed; run it while payments and bills are not being edited."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        for spec in (rollups.PAYMENTS, rollups.UTILITY_BILLS):
+            rows, keys = rollups.rebuild(spec, chunk_size=options['chunk_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f"{spec.rollup_model._meta.verbose_name_plural}: {rows} rows rolled up into {keys} entries."
+            ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from properties.search import create_search_index, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index for properties"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError("Full-text search index is only supported on SQLite.")
+
+        create_search_index(connection)
+        rebuild_search_index(connection.alias)
+        self.stdout.write(self.style.SUCCESS("Property search index rebuilt."))
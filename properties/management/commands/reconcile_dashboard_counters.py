@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from properties.models import DashboardCounters
+
+
+class Command(BaseCommand):
+    help = "Recompute the admin dashboard counters from the properties and agreements tables"
+
+    def handle(self, *args, **kwargs):
+        before = DashboardCounters.objects.filter(pk=1).values(*DashboardCounters.FIELDS).first()
+        after = DashboardCounters.reconcile()
+        if before is None:
+            self.stdout.write("Counters row was missing and has been created.")
+        else:
+            for field in DashboardCounters.FIELDS:
+                if before[field] != after[field]:
+                    self.stdout.write(f"{field}: {before[field]} -> {after[field]}")
+        self.stdout.write(self.style.SUCCESS(
+            ", ".join(f"{field}={after[field]}" for field in DashboardCounters.FIELDS)
+        ))
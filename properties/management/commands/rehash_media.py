@@ -0,0 +1,130 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+
+from properties.cache import bump_generation
+from properties.models import PropertyImage
+from properties.storage import (
+    ContentAddressedStorage,
+    content_addressed_name,
+    hash_content,
+    is_content_addressed,
+)
+
+
+class Command(BaseCommand):
+    help = "Move existing media into the content-addressed storage, merging duplicates"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.dry_run = options['dry_run']
+        self.moved = self.merged = self.missing = 0
+
+        for model in apps.get_models():
+            changed = False
+            for field in model._meta.fields:
+                if isinstance(field, models.FileField) and isinstance(field.storage, ContentAddressedStorage):
+                    changed |= self.rehash_field(model, field)
+            if changed and not self.dry_run:
+                bump_generation(model._meta.model_name)
+
+        if self.rehash_variants() and not self.dry_run:
+            bump_generation('propertyimage')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{self.moved} files moved, {self.merged} duplicates merged, {self.missing} missing."
+        ))
+
+    def rehash_field(self, model, field):
+        # Walk the distinct legacy names in keyset batches so memory stays
+        # bounded and rows we rewrite never shift the iteration.
+        manager = model._default_manager
+        legacy = manager.exclude(**{f'{field.attname}__startswith': 'cas/'}).exclude(
+            **{field.attname: ''}
+        ).exclude(**{f'{field.attname}__isnull': True})
+        changed = False
+        last = None
+        while True:
+            batch = legacy
+            if last is not None:
+                batch = batch.filter(**{f'{field.attname}__gt': last})
+            names = list(
+                batch.order_by(field.attname)
+                .values_list(field.attname, flat=True)
+                .distinct()[:self.batch_size]
+            )
+            if not names:
+                return changed
+            for name in names:
+                if self.dry_run:
+                    self.rehash_file(field.storage, name)
+                    continue
+                with transaction.atomic():
+                    new_name = self.rehash_file(field.storage, name)
+                    if new_name:
+                        count = manager.filter(**{field.attname: name}).update(**{field.attname: new_name})
+                        field.storage.add_reference(new_name, count=count)
+                if new_name:
+                    field.storage.delete(name)
+                    changed = True
+            last = names[-1]
+
+    def rehash_variants(self):
+        storage = PropertyImage._meta.get_field('image').storage
+        changed = False
+        last_id = 0
+        while True:
+            images = list(
+                PropertyImage.objects.filter(id__gt=last_id)
+                .exclude(variants={})
+                .order_by('id')
+                .only('id', 'variants')[:self.batch_size]
+            )
+            if not images:
+                return changed
+            for image in images:
+                variants = {}
+                for key, widths in image.variants.items():
+                    variants[key] = {}
+                    for width, name in widths.items():
+                        new_name = name
+                        if not is_content_addressed(name):
+                            new_name = self.rehash_file(storage, name) or name
+                        variants[key][width] = new_name
+                if variants != image.variants and not self.dry_run:
+                    PropertyImage.objects.filter(id=image.id).update(variants=variants)
+                    for widths in variants.values():
+                        for name in widths.values():
+                            if is_content_addressed(name):
+                                storage.add_reference(name)
+                    for widths in image.variants.values():
+                        for name in widths.values():
+                            if not is_content_addressed(name):
+                                storage.delete(name)
+                    changed = True
+            last_id = images[-1].id
+
+    def rehash_file(self, storage, name):
+        if not storage.exists(name):
+            self.missing += 1
+            self.stderr.write(f"Missing file: {name}")
+            return None
+
+        with storage.open(name, 'rb') as content, transaction.atomic():
+            digest, size = hash_content(content)
+            new_name = content_addressed_name(digest, name)
+            # Lock the StoredFile row before looking at the file, as
+            # ContentAddressedStorage.save() does
+            if not self.dry_run:
+                storage.add_reference(new_name, size, count=0)
+            if storage.exists(new_name):
+                self.merged += 1
+            else:
+                self.moved += 1
+                if not self.dry_run:
+                    storage._save(new_name, content)
+        return new_name
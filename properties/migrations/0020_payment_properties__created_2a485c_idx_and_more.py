@@ -0,0 +1,29 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('properties', '0019_account_ledger_transaction'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['-created_at', '-id'], name='properties__created_2a485c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='property',
+            index=models.Index(fields=['-created_at', '-id'], name='properties__created_388d9e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['-date', '-created_at', '-id'], name='properties__date_baadad_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='utilitybill',
+            index=models.Index(fields=['-bill_date', '-id'], name='properties__bill_da_e0e640_idx'),
+        ),
+    ]
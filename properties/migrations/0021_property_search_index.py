@@ -0,0 +1,37 @@
+from django.db import migrations
+
+# Frozen copy of the index definition in properties/search.py at the time
+# of this migration
+CREATE_INDEX = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS properties_property_fts USING fts5("
+    "title, description, address, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+)
+FILL_INDEX = (
+    "INSERT INTO properties_property_fts(rowid, title, description, address) "
+    "SELECT id, title, description, address FROM properties_property"
+)
+DROP_INDEX = "DROP TABLE IF EXISTS properties_property_fts"
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(CREATE_INDEX)
+    schema_editor.execute(FILL_INDEX)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(DROP_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("properties", "0020_payment_properties__created_2a485c_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
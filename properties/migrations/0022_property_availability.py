@@ -0,0 +1,47 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:04
+
+from django.db import migrations, models
+
+
+def populate_availability(apps, schema_editor):
+    Property = apps.get_model("properties", "Property")
+    Agreement = apps.get_model("properties", "Agreement")
+    agreements = Agreement.objects.filter(property=models.OuterRef("pk"))
+    has_active = models.Exists(agreements.filter(status="active"))
+    has_pending = models.Exists(agreements.filter(status="pending"))
+    Property.objects.update(
+        availability=models.Case(
+            models.When(has_active, rent_or_buy="rent", then=models.Value("rented")),
+            models.When(has_active, then=models.Value("sold")),
+            models.When(has_pending, then=models.Value("pending")),
+            models.When(status="inactive", then=models.Value("hold")),
+            default=models.Value("available"),
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("properties", "0021_property_search_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="property",
+            name="availability",
+            field=models.CharField(
+                choices=[
+                    ("available", "Available"),
+                    ("sold", "Sold"),
+                    ("rented", "Rented"),
+                    ("pending", "Pending"),
+                    ("hold", "Hold"),
+                ],
+                db_index=True,
+                default="available",
+                max_length=20,
+            ),
+        ),
+        migrations.RunPython(populate_availability, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,111 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:05
+
+import logging
+import re
+from decimal import Decimal
+
+import django.core.validators
+from django.db import migrations, models
+
+logger = logging.getLogger(__name__)
+
+# Prices were free text ("150000.00", "1,50,000", "Rs. 25000/-"). Only a
+# currency label, grouping commas and a trailing "/-" are dropped; anything
+# else ("1.500.000", "25k", "") is not guessed at.
+CURRENCY = re.compile(r"^(?:rs\.?|pkr)\s*|\s*/-$", re.IGNORECASE)
+AMOUNT = re.compile(r"\d+(?:\.\d+)?")
+
+
+def parse_price(text):
+    # None when the text is not a plain amount
+    cleaned = CURRENCY.sub("", (text or "").strip())
+    cleaned = re.sub(r"(?<=\d)[, ](?=\d{2,3}\b)", "", cleaned)
+    if not AMOUNT.fullmatch(cleaned):
+        return None
+    return Decimal(cleaned).quantize(Decimal("0.01"))
+
+
+def copy_prices(apps, schema_editor):
+    Property = apps.get_model("properties", "Property")
+    batch = []
+    unparsed = []
+    for prop in Property.objects.only("id", "price").iterator(chunk_size=2000):
+        prop.price_value = parse_price(prop.price)
+        if prop.price_value is None:
+            logger.warning("Property %s has a price that is not an amount: %r", prop.pk, prop.price)
+            unparsed.append(prop.pk)
+            continue
+        batch.append(prop)
+        if len(batch) >= 2000:
+            Property.objects.bulk_update(batch, ["price_value"])
+            batch = []
+    if batch:
+        Property.objects.bulk_update(batch, ["price_value"])
+    # price becomes NOT NULL below, and a made-up amount would pass for a
+    # real one, so these have to be corrected by hand first
+    if unparsed:
+        raise ValueError(
+            f"{len(unparsed)} properties have a price that is not an amount "
+            f"(ids {', '.join(map(str, unparsed[:20]))}{', ...' if len(unparsed) > 20 else ''}). "
+            "Correct them and run the migration again."
+        )
+
+
+def copy_prices_back(apps, schema_editor):
+    Property = apps.get_model("properties", "Property")
+    Property.objects.update(
+        price=models.functions.Cast("price_value", models.TextField())
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("properties", "0022_property_availability"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="property",
+            name="price_value",
+            field=models.DecimalField(decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.AlterField(
+            model_name="property",
+            name="price",
+            field=models.TextField(null=True),
+        ),
+        migrations.RunPython(copy_prices, copy_prices_back),
+        migrations.RemoveField(
+            model_name="property",
+            name="price",
+        ),
+        migrations.RenameField(
+            model_name="property",
+            old_name="price_value",
+            new_name="price",
+        ),
+        migrations.AlterField(
+            model_name="property",
+            name="price",
+            field=models.DecimalField(
+                decimal_places=2,
+                max_digits=12,
+                validators=[django.core.validators.MinValueValidator(0)],
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="property",
+            index=models.Index(
+                fields=["rent_or_buy", "city", "price"],
+                name="properties__rent_or_d4f465_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="property",
+            index=models.Index(
+                fields=["property_category", "property_type", "created_at"],
+                name="properties__propert_32ad7d_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:22
+
+from django.db import migrations, models
+
+
+def populate_counters(apps, schema_editor):
+    Property = apps.get_model("properties", "Property")
+    Agreement = apps.get_model("properties", "Agreement")
+    DashboardCounters = apps.get_model("properties", "DashboardCounters")
+    values = Property.objects.aggregate(
+        total_properties=models.Count("pk"),
+        sold_properties=models.Count("pk", filter=models.Q(availability="sold")),
+        on_rent=models.Count("pk", filter=models.Q(availability="rented")),
+        on_hold=models.Count("pk", filter=models.Q(status="inactive")),
+    )
+    values["pending_requests"] = Agreement.objects.filter(status="pending").count()
+    DashboardCounters.objects.update_or_create(pk=1, defaults=values)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("properties", "0026_property_location"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DashboardCounters",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("total_properties", models.IntegerField(default=0)),
+                ("sold_properties", models.IntegerField(default=0)),
+                ("on_rent", models.IntegerField(default=0)),
+                ("on_hold", models.IntegerField(default=0)),
+                ("pending_requests", models.IntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "verbose_name_plural": "Dashboard counters",
+            },
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
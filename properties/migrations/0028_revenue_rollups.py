@@ -0,0 +1,109 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:24
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce, TruncMonth
+
+
+def populate_rollups(apps, schema_editor):
+    Payment = apps.get_model("properties", "Payment")
+    UtilityBill = apps.get_model("properties", "UtilityBill")
+    PaymentRollup = apps.get_model("properties", "PaymentRollup")
+    UtilityBillRollup = apps.get_model("properties", "UtilityBillRollup")
+    zero = models.Value(0, output_field=models.DecimalField())
+
+    payments = (
+        Payment.objects.order_by()
+        .annotate(month=TruncMonth("date"), rent_or_buy=models.F("agreement__property__rent_or_buy"))
+        .values("month", "method", "status", "rent_or_buy")
+        .annotate(count=models.Count("pk"), amount=Coalesce(models.Sum("amount"), zero))
+    )
+    PaymentRollup.objects.bulk_create([PaymentRollup(**row) for row in payments], batch_size=500)
+
+    paid = models.Q(paid_date__isnull=False)
+    bills = (
+        UtilityBill.objects.order_by()
+        .annotate(month=TruncMonth("bill_date"), rent_or_buy=models.F("agreement__property__rent_or_buy"))
+        .values("month", "bill_type", "rent_or_buy")
+        .annotate(
+            count=models.Count("pk"),
+            billed_amount=Coalesce(models.Sum("bill_amount"), zero),
+            paid_count=models.Count("pk", filter=paid),
+            paid_amount=Coalesce(models.Sum("paid_amount", filter=paid), zero),
+        )
+    )
+    UtilityBillRollup.objects.bulk_create([UtilityBillRollup(**row) for row in bills], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("properties", "0027_dashboardcounters"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PaymentRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("month", models.DateField()),
+                ("method", models.CharField(max_length=20)),
+                ("status", models.CharField(max_length=20)),
+                ("rent_or_buy", models.CharField(max_length=10)),
+                ("count", models.IntegerField(default=0)),
+                (
+                    "amount",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="UtilityBillRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("month", models.DateField()),
+                ("bill_type", models.CharField(max_length=20)),
+                ("rent_or_buy", models.CharField(max_length=10)),
+                ("count", models.IntegerField(default=0)),
+                (
+                    "billed_amount",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("paid_count", models.IntegerField(default=0)),
+                (
+                    "paid_amount",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="paymentrollup",
+            constraint=models.UniqueConstraint(
+                fields=("month", "method", "status", "rent_or_buy"),
+                name="unique_payment_rollup",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="utilitybillrollup",
+            constraint=models.UniqueConstraint(
+                fields=("month", "bill_type", "rent_or_buy"),
+                name="unique_utility_bill_rollup",
+            ),
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
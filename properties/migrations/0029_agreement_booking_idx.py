@@ -0,0 +1,20 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("properties", "0028_revenue_rollups"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="agreement",
+            index=models.Index(
+                fields=["property", "rent_end_date", "rent_start_date", "status"],
+                name="agreement_booking_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("properties", "0029_agreement_booking_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="agreement",
+            name="rent_scheduled_through",
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="payment",
+            name="due_date",
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name="payment",
+            constraint=models.UniqueConstraint(
+                fields=("agreement", "due_date"), name="unique_payment_due_date"
+            ),
+        ),
+    ]
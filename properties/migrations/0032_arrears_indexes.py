@@ -0,0 +1,27 @@
+# Generated by Django 5.0.6 on 2026-10-18 09:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("properties", "0031_agreement_approved_status"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="payment",
+            index=models.Index(
+                fields=["agreement", "due_date", "status", "amount"],
+                name="payment_arrears_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="utilitybill",
+            index=models.Index(
+                fields=["agreement", "due_date", "bill_amount", "paid_amount"],
+                name="utilitybill_arrears_idx",
+            ),
+        ),
+    ]
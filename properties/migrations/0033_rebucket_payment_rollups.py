@@ -0,0 +1,34 @@
+# Generated by Django 5.0.6 on 2026-10-18 11:02
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce, TruncMonth
+
+
+def rebucket_payment_rollups(apps, schema_editor):
+    # Payments with a due date now count towards the month they are due
+    Payment = apps.get_model("properties", "Payment")
+    PaymentRollup = apps.get_model("properties", "PaymentRollup")
+    zero = models.Value(0, output_field=models.DecimalField())
+
+    payments = (
+        Payment.objects.order_by()
+        .annotate(
+            month=TruncMonth(Coalesce("due_date", "date")),
+            rent_or_buy=models.F("agreement__property__rent_or_buy"),
+        )
+        .values("month", "method", "status", "rent_or_buy")
+        .annotate(count=models.Count("pk"), amount=Coalesce(models.Sum("amount"), zero))
+    )
+    PaymentRollup.objects.all().delete()
+    PaymentRollup.objects.bulk_create([PaymentRollup(**row) for row in payments], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("properties", "0032_arrears_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(rebucket_payment_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.0.6 on 2026-10-18 10:39
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("properties", "0033_rebucket_payment_rollups"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PropertySearchEntry",
+            fields=[
+                (
+                    "property",
+                    models.OneToOneField(
+                        db_column="rowid",
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        primary_key=True,
+                        related_name="search_entry",
+                        serialize=False,
+                        to="properties.property",
+                    ),
+                ),
+                ("document", models.TextField(db_column="properties_property_fts")),
+            ],
+            options={
+                "db_table": "properties_property_fts",
+                "managed": False,
+            },
+        ),
+    ]
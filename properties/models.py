@@ -1,6 +1,12 @@
-from django.db import models
-from django.core.validators import MinValueValidator, MaxLengthValidator
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.core.validators import MinValueValidator, MaxValueValidator, MaxLengthValidator
 from account.models import User
+from .geo import encode as geohash_encode
+from .live import publish_on_commit
+from .search import Match
 class PropertyCategory(models.Model):
   name = models.CharField(max_length=100, unique=True)
 
@@ -32,6 +38,14 @@ class Property(models.Model):
     ('buy', 'Buy')
   )
 
+  AVAILABILITY_CHOICES = (
+    ('available', 'Available'),
+    ('sold', 'Sold'),
+    ('rented', 'Rented'),
+    ('pending', 'Pending'),
+    ('hold', 'Hold')
+  )
+
   title = models.CharField(
     max_length=200,
     validators=[MaxLengthValidator(200)],
@@ -42,14 +56,12 @@ class Property(models.Model):
     blank=False,
     null=False
   )
-  price = models.TextField(
-     blank=False,
+  price = models.DecimalField(
+    max_digits=12,
+    decimal_places=2,
+    validators=[MinValueValidator(0)],
+    blank=False,
     null=False
-   # max_digits=10,
-   # decimal_places=2,
-    #validators=[MinValueValidator(0.01)],
-    #blank=False,
-    #null=False
   )
   address = models.CharField(
     max_length=255,
@@ -105,16 +117,119 @@ class Property(models.Model):
     choices=RENT_OR_BUY_CHOICES,
     default='buy'
   )
+  latitude = models.DecimalField(
+    max_digits=9,
+    decimal_places=6,
+    validators=[MinValueValidator(-90), MaxValueValidator(90)],
+    blank=True,
+    null=True
+  )
+  longitude = models.DecimalField(
+    max_digits=9,
+    decimal_places=6,
+    validators=[MinValueValidator(-180), MaxValueValidator(180)],
+    blank=True,
+    null=True
+  )
+  # Geohash of latitude/longitude, indexed for near/bbox lookups (see geo.py)
+  geohash = models.CharField(
+    max_length=12,
+    blank=True,
+    null=True,
+    db_index=True
+  )
+  # Denormalized from the agreements so listings can filter on one indexed
+  # column instead of joining agreements; kept current by Agreement.save and
+  # the post_delete signal, rebuilt with `manage.py rebuild_availability`.
+  availability = models.CharField(
+    max_length=20,
+    choices=AVAILABILITY_CHOICES,
+    default='available',
+    db_index=True
+  )
   created_at = models.DateTimeField(auto_now_add=True)
   updated_at = models.DateTimeField(auto_now=True)
 
 
   class Meta:
     verbose_name_plural = "Properties"
+    indexes = [
+      models.Index(fields=['-created_at', '-id']),
+      models.Index(fields=['rent_or_buy', 'city', 'price']),
+      models.Index(fields=['property_category', 'property_type', 'created_at']),
+    ]
 
   def __str__(self):
     return self.title
 
+  def save(self, *args, **kwargs):
+    # status and rent_or_buy both feed into availability
+    self.availability = self.compute_availability()
+    self.geohash = self.compute_geohash()
+    super().save(*args, **kwargs)
+
+  def compute_geohash(self):
+    if self.latitude is None or self.longitude is None:
+      return None
+    return geohash_encode(float(self.latitude), float(self.longitude))
+
+  def compute_availability(self):
+    statuses = set()
+    if self.pk:
+      statuses = set(
+        Agreement.objects.filter(property_id=self.pk).values_list('status', flat=True)
+      )
+
+    if 'active' in statuses:
+      return 'rented' if self.rent_or_buy == 'rent' else 'sold'
+    if statuses & {'pending', 'approved'}:
+      return 'pending'
+    if self.status == 'inactive':
+      return 'hold'
+    return 'available'
+
+  @classmethod
+  def availability_expression(cls):
+    # SQL equivalent of compute_availability, for rebuilding in bulk
+    agreements = Agreement.objects.filter(property=models.OuterRef('pk'))
+    has_active = models.Exists(agreements.filter(status='active'))
+    has_pending = models.Exists(agreements.filter(status__in=['pending', 'approved']))
+    return models.Case(
+      models.When(has_active, rent_or_buy='rent', then=models.Value('rented')),
+      models.When(has_active, then=models.Value('sold')),
+      models.When(has_pending, then=models.Value('pending')),
+      models.When(status='inactive', then=models.Value('hold')),
+      default=models.Value('available'),
+      output_field=models.CharField()
+    )
+
+  @classmethod
+  def lock(cls, pk, using=None):
+    # Row lock until the end of the transaction. SQLite has no row locks and
+    # a transaction that read before writing fails when another writer got
+    # in first, so there the lock is a write, which waits its turn instead.
+    if transaction.get_connection(using).features.has_select_for_update:
+      cls.objects.using(using).select_for_update().filter(pk=pk).exists()
+    else:
+      cls.objects.using(using).filter(pk=pk).update(availability=models.F('availability'))
+
+  def refresh_availability(self):
+    availability = self.compute_availability()
+    if availability != self.availability:
+      previous = Property.objects.filter(pk=self.pk).values_list('availability', 'status').first()
+      self.availability = availability
+      self.updated_at = timezone.now()
+      Property.objects.filter(pk=self.pk).update(
+        availability=availability,
+        updated_at=self.updated_at
+      )
+      # A queryset update sends no signals, so adjust the counters here
+      if previous:
+        DashboardCounters.apply(
+          DashboardCounters.property_counts(*previous),
+          DashboardCounters.property_counts(availability, previous[1])
+        )
+
 
 class Customer(models.Model):
   user = models.ForeignKey(
@@ -152,10 +267,25 @@ class Customer(models.Model):
 class Agreement(models.Model):
     STATUS_CHOICES = (
         ('pending', 'Pending'),
+        ('approved', 'Approved'),
         ('active', 'Active'),
         ('completed', 'Completed'),
         ('cancelled', 'Cancelled')
     )
+    # Agreements in these states hold the property for their rent period
+    BOOKING_STATUSES = ('pending', 'approved', 'active')
+    # action: (statuses it can start from, resulting status)
+    TRANSITIONS = {
+        'approve': (('pending',), 'approved'),
+        'activate': (('approved',), 'active'),
+        'complete': (('active',), 'completed'),
+        'cancel': (('pending', 'approved'), 'cancelled'),
+    }
+    # Only these can be deleted; the others are cancelled or completed
+    DELETABLE_STATUSES = ('pending', 'cancelled')
+    # Editing these after the rent schedule was generated makes the
+    # scheduler reconcile the agreement's pending payments again
+    SCHEDULE_FIELDS = ('rent_amount', 'rent_start_date', 'rent_end_date')
 
     property = models.ForeignKey(
         Property,
@@ -198,6 +328,12 @@ class Agreement(models.Model):
         blank=True,
         null=True
     )
+    # The rent schedule's pending payments exist up to this date
+    rent_scheduled_through = models.DateField(
+        blank=True,
+        null=True,
+        editable=False
+    )
     purchase_amount = models.DecimalField(
         max_digits=10,
         decimal_places=2,
@@ -226,10 +362,88 @@ class Agreement(models.Model):
 
     class Meta:
         verbose_name_plural = "Agreements"
+        indexes = [
+            # Overlap lookups seek on rent_end_date >= start, which skips the
+            # history that ended earlier; status rides along so the index
+            # answers the whole query
+            models.Index(
+                fields=['property', 'rent_end_date', 'rent_start_date', 'status'],
+                name='agreement_booking_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"Agreement for {self.property.title}"
 
+    def transition(self, action, using=None):
+        """
+        Moves the agreement along TRANSITIONS. The property row is locked
+        first, so concurrent transitions on the same property run one at a
+        time, and the status, the property's availability and the counters
+        all change in one transaction. Completing an agreement also deletes
+        its pending payments due after today. Raises ValidationError when
+        the transition is not allowed.
+        """
+        sources, target = self.TRANSITIONS[action]
+        with transaction.atomic(using=using):
+            Property.lock(self.property_id, using=using)
+            agreement = Agreement.objects.using(using).select_for_update().select_related('property').get(pk=self.pk)
+            if agreement.status not in sources:
+                raise ValidationError(f"Cannot {action} an agreement that is {agreement.status}.")
+
+            others = Agreement.objects.using(using).filter(property_id=agreement.property_id).exclude(pk=agreement.pk)
+            if target == 'active' and others.filter(status='active').exists():
+                raise ValidationError("The property already has an active agreement.")
+            if target in self.BOOKING_STATUSES and agreement.rent_start_date and agreement.rent_end_date:
+                clash = Agreement.bookings(
+                    [agreement.property_id], agreement.rent_start_date, agreement.rent_end_date
+                ).using(using).exclude(pk=agreement.pk).first()
+                if clash:
+                    raise ValidationError(f"The rent period overlaps agreement {clash.pk}.")
+
+            agreement.status = target
+            agreement.save(using=using)
+            if target == 'completed':
+                # The scheduler only reconciles active agreements, so rent
+                # that would fall due after completion is dropped here. The
+                # deletes go through the signals that keep the rollups.
+                agreement.payments.using(using).filter(
+                    status='pending', due_date__gt=timezone.localdate()
+                ).delete()
+        return agreement
+
+    @classmethod
+    def bookings(cls, property_ids, start, end):
+        # Bookings on any of the properties that overlap [start, end]
+        return cls.objects.filter(
+            property_id__in=property_ids,
+            status__in=cls.BOOKING_STATUSES,
+            rent_start_date__lte=end,
+            rent_end_date__gte=start,
+        )
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            previous_property_id = None
+            if not self._state.adding:
+                previous = Agreement.objects.filter(pk=self.pk).values(
+                    'property_id', *self.SCHEDULE_FIELDS
+                ).first() or {}
+                previous_property_id = previous.get('property_id')
+                if self.rent_scheduled_through and any(
+                    previous.get(field) != getattr(self, field) for field in self.SCHEDULE_FIELDS
+                ):
+                    self.rent_scheduled_through = None
+                    if kwargs.get('update_fields') is not None:
+                        kwargs['update_fields'] = {*kwargs['update_fields'], 'rent_scheduled_through'}
+
+            super().save(*args, **kwargs)
+
+            # Keep the denormalized Property.availability in step
+            self.property.refresh_availability()
+            if previous_property_id and previous_property_id != self.property_id:
+                Property.objects.get(pk=previous_property_id).refresh_availability()
+
 class Payment(models.Model):
     STATUS_CHOICES = (
         ('pending', 'Pending'),
@@ -273,17 +487,42 @@ class Payment(models.Model):
     date = models.DateField(
         auto_now_add=True
     )
+    # Set on payments generated from an agreement's rent schedule
+    due_date = models.DateField(
+        blank=True,
+        null=True
+    )
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         verbose_name_plural = "Payments"
+        indexes = [
+            models.Index(fields=['-created_at', '-id']),
+            # Covers the per-agreement sums of the arrears report
+            models.Index(
+                fields=['agreement', 'due_date', 'status', 'amount'],
+                name='payment_arrears_idx',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['agreement', 'due_date'],
+                name='unique_payment_due_date',
+            ),
+        ]
 
     def __str__(self):
         return f"Payment of {self.amount} for {self.agreement}"
 
 class PropertyImage(models.Model):
+    VARIANTS_STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed')
+    )
+
     property = models.ForeignKey(
         Property,
         on_delete=models.CASCADE,
@@ -294,6 +533,17 @@ class PropertyImage(models.Model):
         blank=True,
         null=True
     )
+    # Resized copies generated in the background, as
+    # {format: {width: storage name}}; see properties/images.py
+    variants = models.JSONField(
+        default=dict,
+        blank=True
+    )
+    variants_status = models.CharField(
+        max_length=20,
+        choices=VARIANTS_STATUS_CHOICES,
+        default='pending'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -347,10 +597,164 @@ class UtilityBill(models.Model):
 
     class Meta:
         ordering = ['-bill_date']
+        indexes = [
+            models.Index(fields=['-bill_date', '-id']),
+            # Covers the per-agreement sums of the arrears report
+            models.Index(
+                fields=['agreement', 'due_date', 'bill_amount', 'paid_amount'],
+                name='utilitybill_arrears_idx',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.bill_type} bill for {self.agreement}"
 
+class PropertySearchEntry(models.Model):
+    # A row of the FTS5 index kept by properties/search.py. It is never
+    # written through the ORM; ?search= joins it to match and rank in one pass.
+    property = models.OneToOneField(
+        Property,
+        primary_key=True,
+        db_column='rowid',
+        db_constraint=False,
+        on_delete=models.DO_NOTHING,
+        related_name='search_entry'
+    )
+    # FTS5's hidden column named after the table, the left side of MATCH
+    document = models.TextField(db_column='properties_property_fts')
+
+    class Meta:
+        managed = False
+        db_table = 'properties_property_fts'
+
+PropertySearchEntry._meta.get_field('document').register_lookup(Match)
+
+class StoredFile(models.Model):
+    # Reference count for a file in the content-addressed media storage
+    # (properties/storage.py). The file is removed when this drops to zero.
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField(default=0)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.name
+
+class DashboardCounters(models.Model):
+    # Single row (pk=1) of admin dashboard numbers, adjusted by the Property
+    # and Agreement signals in the same transaction as the change.
+    # `manage.py reconcile_dashboard_counters` recomputes it from scratch.
+    total_properties = models.IntegerField(default=0)
+    sold_properties = models.IntegerField(default=0)
+    on_rent = models.IntegerField(default=0)
+    on_hold = models.IntegerField(default=0)
+    pending_requests = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    FIELDS = ('total_properties', 'sold_properties', 'on_rent', 'on_hold', 'pending_requests')
+
+    class Meta:
+        verbose_name_plural = "Dashboard counters"
+
+    @staticmethod
+    def property_counts(availability, status):
+        return {
+            'total_properties': 1,
+            'sold_properties': int(availability == 'sold'),
+            'on_rent': int(availability == 'rented'),
+            'on_hold': int(status == 'inactive'),
+        }
+
+    @staticmethod
+    def agreement_counts(status):
+        return {'pending_requests': int(status == 'pending')}
+
+    @classmethod
+    def apply(cls, old=None, new=None, using=None):
+        # old/new are the *_counts() of a row before and after a change,
+        # None when it did not exist
+        deltas = {}
+        for counts, sign in ((old or {}, -1), (new or {}, 1)):
+            for field, value in counts.items():
+                deltas[field] = deltas.get(field, 0) + sign * value
+        deltas = {field: value for field, value in deltas.items() if value}
+        if deltas:
+            updated = cls.objects.using(using).filter(pk=1).update(
+                updated_at=timezone.now(),
+                **{field: models.F(field) + value for field, value in deltas.items()}
+            )
+            if updated:
+                publish_on_commit('counters', deltas, using=using)
+
+    @classmethod
+    def compute(cls, using=None):
+        # All five numbers in one conditional-aggregate query. The pending
+        # count is a scalar subquery folded in with Max; every agreement
+        # belongs to a property, so no properties means no agreements.
+        # sold_properties and on_rent count properties, not active
+        # agreements; a property has at most one active agreement.
+        pending = Agreement.objects.using(using).filter(status='pending').order_by().values(
+            'status'
+        ).annotate(count=models.Count('pk')).values('count')
+        return Property.objects.using(using).aggregate(
+            total_properties=models.Count('pk'),
+            sold_properties=models.Count('pk', filter=models.Q(availability='sold')),
+            on_rent=models.Count('pk', filter=models.Q(availability='rented')),
+            on_hold=models.Count('pk', filter=models.Q(status='inactive')),
+            pending_requests=Coalesce(
+                models.Max(models.Subquery(pending, output_field=models.IntegerField())), 0
+            ),
+        )
+
+    @classmethod
+    def reconcile(cls, using=None):
+        with transaction.atomic(using=using):
+            values = cls.compute(using=using)
+            cls.objects.using(using).update_or_create(pk=1, defaults=values)
+        return values
+
+    @classmethod
+    def current(cls, using=None):
+        values = cls.objects.using(using).filter(pk=1).values(*cls.FIELDS).first()
+        return values if values is not None else cls.compute(using=using)
+
+class PaymentRollup(models.Model):
+    # Payment totals per month and dimension, maintained by signals; see
+    # properties/rollups.py and `manage.py rebuild_revenue_rollups`
+    month = models.DateField()
+    method = models.CharField(max_length=20)
+    status = models.CharField(max_length=20)
+    rent_or_buy = models.CharField(max_length=10)
+    count = models.IntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['month', 'method', 'status', 'rent_or_buy'],
+                name='unique_payment_rollup'
+            ),
+        ]
+
+class UtilityBillRollup(models.Model):
+    # Utility bill totals per billing month, bill type and rent/buy
+    month = models.DateField()
+    bill_type = models.CharField(max_length=20)
+    rent_or_buy = models.CharField(max_length=10)
+    count = models.IntegerField(default=0)
+    billed_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    paid_count = models.IntegerField(default=0)
+    paid_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['month', 'bill_type', 'rent_or_buy'],
+                name='unique_utility_bill_rollup'
+            ),
+        ]
+
 class Account(models.Model):
     name = models.CharField(max_length=100, unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -426,6 +830,9 @@ class Transaction(models.Model):
 
     class Meta:
         ordering = ['-date', '-created_at']
+        indexes = [
+            models.Index(fields=['-date', '-created_at', '-id']),
+        ]
 
     def save(self, *args, **kwargs):
         is_new = self._state.adding  # Check if this is a new transaction
@@ -0,0 +1,143 @@
+import base64
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class GeneralPagination(PageNumberPagination):
+  page_size = 10  # Default page size
+  page_size_query_param = 'page_size'
+  max_page_size = 100000
+
+  # Keyset (cursor) mode, opted into with ?pagination=cursor. Pages are
+  # fetched with a WHERE on the view's `cursor_ordering` columns instead of
+  # COUNT(*) + OFFSET, so deep pages cost the same as the first one.
+  mode_query_param = 'pagination'
+  cursor_query_param = 'cursor'
+  invalid_cursor_message = 'Invalid cursor'
+  ordering_conflict_message = (
+    'Cursor pagination follows the default ordering only; use page numbers '
+    'with ?ordering=, ?near= or ?search=.'
+  )
+
+  def is_cursor_request(self, request):
+    return (
+      request.query_params.get(self.mode_query_param) == 'cursor'
+      or self.cursor_query_param in request.query_params
+    )
+
+  def paginate_queryset(self, queryset, request, view=None):
+    self.cursor_mode = self.is_cursor_request(request)
+    if not self.cursor_mode:
+      return super().paginate_queryset(queryset, request, view)
+    return self.paginate_queryset_by_cursor(queryset, request, view)
+
+  def get_paginated_response(self, data):
+    if not self.cursor_mode:
+      return super().get_paginated_response(data)
+    return Response({
+      'next': self.get_cursor_link(self.next_position, reverse=False),
+      'previous': self.get_cursor_link(self.previous_position, reverse=True),
+      'results': data,
+    })
+
+  def paginate_queryset_by_cursor(self, queryset, request, view):
+    self.request = request
+    self.page_size = self.get_page_size(request)
+    self.ordering = list(getattr(view, 'cursor_ordering', ('-created_at', '-id')))
+    self.fields = [field.lstrip('-') for field in self.ordering]
+    # A cursor is a position in cursor_ordering, so it cannot follow any
+    # other order the view or a filter put on the queryset
+    current = list(queryset.query.order_by)
+    if current != self.ordering[:len(current)]:
+      raise ValidationError({self.mode_query_param: self.ordering_conflict_message})
+
+    position, reverse = self.decode_cursor(queryset.model, request)
+    ordering = [self.flip(field) for field in self.ordering] if reverse else self.ordering
+    queryset = queryset.order_by(*ordering)
+    if position is not None:
+      queryset = queryset.filter(self.after(position, ordering))
+
+    rows = list(queryset[:self.page_size + 1])
+    has_more = len(rows) > self.page_size
+    rows = rows[:self.page_size]
+    if reverse:
+      rows.reverse()
+
+    first = self.get_position(rows[0]) if rows else None
+    last = self.get_position(rows[-1]) if rows else None
+    if reverse:
+      self.next_position = last
+      self.previous_position = first if has_more else None
+    else:
+      self.next_position = last if has_more else None
+      self.previous_position = first if position is not None and rows else None
+    return rows
+
+  def flip(self, field):
+    return field[1:] if field.startswith('-') else '-' + field
+
+  def after(self, position, ordering):
+    # Expands (a, b, c) > (x, y, z) into OR-ed prefixes so the leading
+    # column can still drive an index range scan.
+    condition = Q()
+    for index, field in enumerate(ordering):
+      name = field.lstrip('-')
+      lookup = '__lt' if field.startswith('-') else '__gt'
+      term = Q(**{name + lookup: position[index]})
+      for previous in range(index):
+        term &= Q(**{self.fields[previous]: position[previous]})
+      condition |= term
+    return condition
+
+  def get_position(self, instance):
+    return [getattr(instance, field) for field in self.fields]
+
+  def decode_cursor(self, model, request):
+    encoded = request.query_params.get(self.cursor_query_param)
+    if not encoded:
+      return None, False
+    try:
+      payload = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+      values = payload['p']
+      if len(values) != len(self.fields):
+        raise ValueError
+      position = [
+        model._meta.get_field(field).to_python(value)
+        for field, value in zip(self.fields, values)
+      ]
+      return position, bool(payload.get('r'))
+    except Exception:
+      raise ValidationError({self.cursor_query_param: self.invalid_cursor_message})
+
+  def encode_cursor(self, position, reverse):
+    values = [value.isoformat() if hasattr(value, 'isoformat') else value for value in position]
+    payload = json.dumps({'p': values, 'r': int(reverse)}, default=str)
+    return base64.urlsafe_b64encode(payload.encode('ascii')).decode('ascii')
+
+  def get_cursor_link(self, position, reverse):
+    if position is None:
+      return None
+    url = self.request.build_absolute_uri()
+    url = remove_query_param(url, self.page_query_param)
+    url = replace_query_param(url, self.mode_query_param, 'cursor')
+    return replace_query_param(url, self.cursor_query_param, self.encode_cursor(position, reverse))
+
+
+class CursorOnlyPagination(GeneralPagination):
+  # For listings that were historically unpaginated: plain requests keep
+  # returning every row, ?pagination=cursor opts into keyset pages.
+  def paginate_queryset(self, queryset, request, view=None):
+    self.cursor_mode = self.is_cursor_request(request)
+    if not self.cursor_mode:
+      return None
+    return self.paginate_queryset_by_cursor(queryset, request, view)
+
+class PageNumberOnlyPagination(GeneralPagination):
+  # For lists sorted on computed columns, which a keyset cursor cannot follow
+  def is_cursor_request(self, request):
+    return False
@@ -0,0 +1,142 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .live import publish_on_commit
+from .models import Payment, PaymentRollup, UtilityBill, UtilityBillRollup
+
+# Monthly revenue rollups. Every payment and bill contributes one entry,
+# (key, measures), to its rollup table. Saves and deletes subtract the
+# entry the row had before and add the one it has after, all inside the
+# same transaction. Entries are read back from the database so that the
+# incremental path and the rebuild agree exactly. A property switching
+# between rent and buy is only picked up by a rebuild.
+
+
+class RollupSpec:
+
+  def __init__(self, model, rollup_model, source_fields, entry):
+    self.model = model
+    self.rollup_model = rollup_model
+    self.source_fields = source_fields
+    self.entry = entry
+
+  def read_entry(self, pk, using=None):
+    row = self.model.objects.using(using).filter(pk=pk).values(*self.source_fields).first()
+    return self.entry(row) if row else None
+
+  def iter_entries(self, chunk_size=2000, using=None):
+    rows = self.model.objects.using(using).order_by().values(*self.source_fields)
+    for row in rows.iterator(chunk_size=chunk_size):
+      yield self.entry(row)
+
+
+def month_of(value):
+  return value.replace(day=1)
+
+
+def payment_entry(row):
+  # Scheduled rent belongs to the month it is due, not the night it was
+  # generated; other payments to the day they were recorded
+  key = {
+    'month': month_of(row['due_date'] or row['date']),
+    'method': row['method'],
+    'status': row['status'],
+    'rent_or_buy': row['agreement__property__rent_or_buy'],
+  }
+  return key, {'count': 1, 'amount': row['amount']}
+
+
+def utility_bill_entry(row):
+  paid = row['paid_date'] is not None
+  key = {
+    'month': month_of(row['bill_date']),
+    'bill_type': row['bill_type'],
+    'rent_or_buy': row['agreement__property__rent_or_buy'],
+  }
+  return key, {
+    'count': 1,
+    'billed_amount': row['bill_amount'],
+    'paid_count': int(paid),
+    'paid_amount': (row['paid_amount'] or Decimal('0')) if paid else Decimal('0'),
+  }
+
+
+PAYMENTS = RollupSpec(
+  Payment, PaymentRollup,
+  ('date', 'due_date', 'method', 'status', 'amount', 'agreement__property__rent_or_buy'),
+  payment_entry
+)
+UTILITY_BILLS = RollupSpec(
+  UtilityBill, UtilityBillRollup,
+  ('bill_date', 'bill_type', 'bill_amount', 'paid_amount', 'paid_date', 'agreement__property__rent_or_buy'),
+  utility_bill_entry
+)
+SPECS = {spec.model: spec for spec in (PAYMENTS, UTILITY_BILLS)}
+
+
+def publish_delta(spec, key, measures, using=None):
+  data = {'table': spec.rollup_model._meta.model_name, **key, **measures}
+  data['month'] = key['month'].strftime('%Y-%m')
+  publish_on_commit('revenue', data, using=using)
+
+
+def accumulate(totals, entry, sign=1):
+  key, measures = entry
+  bucket = totals[tuple(sorted(key.items()))]
+  for field, value in measures.items():
+    bucket[field] = bucket.get(field, 0) + sign * value
+
+
+def apply(spec, old=None, new=None, using=None):
+  totals = defaultdict(dict)
+  if old:
+    accumulate(totals, old, -1)
+  if new:
+    accumulate(totals, new)
+  apply_totals(spec, totals, using=using)
+
+
+def add(spec, entries, using=None):
+  # For rows inserted with bulk_create, which skips post_save
+  totals = defaultdict(dict)
+  for entry in entries:
+    accumulate(totals, entry)
+  apply_totals(spec, totals, using=using)
+
+
+def apply_totals(spec, totals, using=None):
+  for key, measures in totals.items():
+    measures = {field: value for field, value in measures.items() if value}
+    if not measures:
+      continue
+    key = dict(key)
+    rows = spec.rollup_model.objects.using(using).filter(**key)
+    with transaction.atomic(using=using):
+      if not rows.update(**{field: F(field) + value for field, value in measures.items()}):
+        try:
+          with transaction.atomic(using=using):
+            spec.rollup_model.objects.using(using).create(**key, **measures)
+        except IntegrityError:
+          # Created concurrently; add to that row instead
+          rows.update(**{field: F(field) + value for field, value in measures.items()})
+    publish_delta(spec, key, measures, using=using)
+
+
+def rebuild(spec, chunk_size=2000, using=None):
+  # Streams the source rows; only the per-key totals are held in memory
+  totals = defaultdict(dict)
+  rows = 0
+  for entry in spec.iter_entries(chunk_size=chunk_size, using=using):
+    accumulate(totals, entry)
+    rows += 1
+
+  with transaction.atomic(using=using):
+    spec.rollup_model.objects.using(using).all().delete()
+    spec.rollup_model.objects.using(using).bulk_create(
+      [spec.rollup_model(**dict(key), **measures) for key, measures in totals.items()],
+      batch_size=500
+    )
+  return rows, len(totals)
@@ -0,0 +1,132 @@
+import calendar
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import F, Q
+
+from . import rollups
+from .cache import invalidate_generation
+from .models import Agreement, Payment
+
+
+def add_months(value, months):
+  # Same day of the month, clamped to the month's last day
+  month = value.month - 1 + months
+  year, month = value.year + month // 12, month % 12 + 1
+  return value.replace(year=year, month=month, day=min(value.day, calendar.monthrange(year, month)[1]))
+
+
+def due_dates(start, end):
+  months = 0
+  due = start
+  while due <= end:
+    yield due
+    months += 1
+    due = add_months(start, months)
+
+
+class RentScheduler:
+  """
+  Generates the pending monthly Payments of active rent agreements, one per
+  month from rent_start_date through rent_end_date at rent_amount.
+
+  Only agreements whose schedule has not been generated through their
+  current rent_end_date are read, in batches by id, so a nightly run over
+  complete schedules is a single query. Saving an agreement with a new
+  rent amount or period clears rent_scheduled_through, and the next run
+  reconciles it: pending payments outside the period are deleted, those
+  inside it take the new amount, and missing due dates are added. Paid or
+  failed payments are history and are left alone. Each batch is one
+  transaction with one bulk_create.
+  """
+
+  def __init__(self, batch_size=500):
+    self.batch_size = batch_size
+    self.agreements = 0
+    self.created = 0
+    self.updated = 0
+    self.removed = 0
+
+  def pending_agreements(self):
+    return Agreement.objects.filter(
+      Q(rent_scheduled_through__isnull=True) | ~Q(rent_scheduled_through=F('rent_end_date')),
+      status='active',
+      property__rent_or_buy='rent',
+      rent_amount__isnull=False,
+      rent_start_date__isnull=False,
+      rent_end_date__isnull=False,
+    )
+
+  def run(self, agreement_ids=None):
+    agreements = self.pending_agreements()
+    if agreement_ids is not None:
+      agreements = agreements.filter(pk__in=agreement_ids)
+    agreements = agreements.order_by('pk').values('pk', 'rent_amount', 'rent_start_date', 'rent_end_date')
+
+    last_pk = 0
+    while True:
+      batch = list(agreements.filter(pk__gt=last_pk)[:self.batch_size])
+      if not batch:
+        break
+      self.flush(batch)
+      last_pk = batch[-1]['pk']
+    if self.agreements:
+      invalidate_generation('agreement')
+    if self.created or self.updated or self.removed:
+      invalidate_generation('payment')
+    return self.summary()
+
+  def summary(self):
+    return {
+      'agreements': self.agreements,
+      'payments': self.created,
+      'updated': self.updated,
+      'removed': self.removed,
+    }
+
+  def flush(self, batch):
+    with transaction.atomic():
+      scheduled = defaultdict(dict)
+      rows = Payment.objects.filter(
+        agreement_id__in=[agreement['pk'] for agreement in batch], due_date__isnull=False
+      ).only('id', 'agreement_id', 'due_date', 'status', 'amount')
+      for payment in rows:
+        scheduled[payment.agreement_id][payment.due_date] = payment
+
+      payments = []
+      for agreement in batch:
+        dues = list(due_dates(agreement['rent_start_date'], agreement['rent_end_date']))
+        existing = scheduled[agreement['pk']]
+        # Edited agreements only; a complete schedule has nothing to change.
+        # Saves and deletes go through the signals that keep the rollups.
+        for due, payment in existing.items():
+          if payment.status != 'pending':
+            continue
+          if due not in dues:
+            payment.delete()
+            self.removed += 1
+          elif payment.amount != agreement['rent_amount']:
+            payment.amount = agreement['rent_amount']
+            payment.save(update_fields=['amount', 'updated_at'])
+            self.updated += 1
+        payments += [
+          Payment(agreement_id=agreement['pk'], amount=agreement['rent_amount'], due_date=due, status='pending')
+          for due in dues if due not in existing
+        ]
+      created = Payment.objects.bulk_create(payments, batch_size=1000)
+      # bulk_create skips post_save, so keep the revenue rollups in step here
+      rollups.add(rollups.PAYMENTS, [
+        rollups.payment_entry({
+          'date': payment.date,
+          'due_date': payment.due_date,
+          'method': payment.method,
+          'status': payment.status,
+          'amount': payment.amount,
+          'agreement__property__rent_or_buy': 'rent',
+        }) for payment in created
+      ])
+      Agreement.objects.filter(pk__in=[agreement['pk'] for agreement in batch]).update(
+        rent_scheduled_through=F('rent_end_date')
+      )
+    self.agreements += len(batch)
+    self.created += len(created)
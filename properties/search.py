@@ -0,0 +1,132 @@
+from django.db import connections
+from django.db.models import F, FloatField, Func, Lookup, Value
+from rest_framework import filters
+
+# SQLite FTS5 index over the searchable Property columns. It is a regular
+# (not external-content) FTS table so rows can be replaced by id from
+# post_save/post_delete without knowing the previous column values, and it
+# survives the table rebuilds SQLite migrations do on properties_property.
+FTS_TABLE = 'properties_property_fts'
+FTS_COLUMNS = ('title', 'description', 'address')
+# bm25 column weights, in FTS_COLUMNS order: title matches rank highest
+FTS_WEIGHTS = (10.0, 1.0, 5.0)
+
+_available = {}
+
+
+def create_search_index(connection):
+  with connection.cursor() as cursor:
+    cursor.execute(
+      f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+      f"{', '.join(FTS_COLUMNS)}, tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+  _available.pop(connection.alias, None)
+
+
+def drop_search_index(connection):
+  with connection.cursor() as cursor:
+    cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+  _available.pop(connection.alias, None)
+
+
+def search_index_available(using='default'):
+  if using not in _available:
+    connection = connections[using]
+    _available[using] = (
+      connection.vendor == 'sqlite'
+      and FTS_TABLE in connection.introspection.table_names()
+    )
+  return _available[using]
+
+
+def rebuild_search_index(using='default'):
+  connection = connections[using]
+  columns = ', '.join(FTS_COLUMNS)
+  with connection.cursor() as cursor:
+    cursor.execute(f"DELETE FROM {FTS_TABLE}")
+    cursor.execute(
+      f"INSERT INTO {FTS_TABLE}(rowid, {columns}) "
+      f"SELECT id, {columns} FROM properties_property"
+    )
+    cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+
+
+def index_properties(properties, using='default'):
+  if not search_index_available(using):
+    return
+  rows = [
+    (prop.pk, *[getattr(prop, column) for column in FTS_COLUMNS])
+    for prop in properties
+  ]
+  if not rows:
+    return
+  placeholders = ', '.join(['%s'] * (len(FTS_COLUMNS) + 1))
+  with connections[using].cursor() as cursor:
+    cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+    cursor.executemany(
+      f"INSERT INTO {FTS_TABLE}(rowid, {', '.join(FTS_COLUMNS)}) VALUES ({placeholders})",
+      rows
+    )
+
+
+def unindex_property(pk, using='default'):
+  if not search_index_available(using):
+    return
+  with connections[using].cursor() as cursor:
+    cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [pk])
+
+
+def build_match_query(terms):
+  # Every term must match; each is quoted so user input can't inject FTS
+  # syntax, and gets a prefix star so results update as the user types.
+  tokens = []
+  for term in terms:
+    term = term.replace('"', ' ').strip()
+    if term:
+      tokens.append(f'"{term}"*')
+  return ' '.join(tokens)
+
+
+class Match(Lookup):
+  # `index MATCH query`, with the index's hidden table-named column on the left
+  lookup_name = 'match'
+
+  def as_sql(self, compiler, connection):
+    lhs, lhs_params = self.process_lhs(compiler, connection)
+    rhs, rhs_params = self.process_rhs(compiler, connection)
+    return f'{lhs} MATCH {rhs}', [*lhs_params, *rhs_params]
+
+
+class Rank(Func):
+  # bm25 of the row the MATCH found, lower is better
+  function = 'bm25'
+  output_field = FloatField()
+
+  def __init__(self, document):
+    super().__init__(document, *[Value(weight) for weight in FTS_WEIGHTS])
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+  """
+  SearchFilter that answers ?search= from the FTS5 index, ordered by bm25
+  rank unless an explicit ?ordering= is given. Falls back to the regular
+  icontains search on databases without the index.
+  """
+
+  def filter_queryset(self, request, queryset, view):
+    terms = self.get_search_terms(request)
+    if not terms or not search_index_available(queryset.db):
+      return super().filter_queryset(request, queryset, view)
+
+    match = build_match_query(terms)
+    if not match:
+      return queryset
+
+    # One MATCH over the index, joined to the property rows by rowid; the
+    # rank is computed in the same pass
+    queryset = queryset.filter(search_entry__document__match=match).annotate(
+      search_rank=Rank(F('search_entry__document'))
+    )
+    if not request.query_params.get('ordering'):
+      queryset = queryset.order_by('search_rank', *queryset.query.order_by)
+    return queryset
@@ -1,13 +1,111 @@
 from rest_framework import serializers
 from .models import Property, PropertyCategory, PropertyType, Agreement, Customer, PropertyImage, Payment, UtilityBill, Account, Ledger, Transaction
 from account.models import User
+from .images import get_srcset
 from django.core.files.base import ContentFile
+from django.db.models import Count, JSONField, OuterRef, Q, Subquery
+from django.db.models.functions import JSONObject
 import base64
+import json
 
-class PropertySerializer(serializers.ModelSerializer):
+class EagerLoadingMixin:
+  # Maps a rendered field name to the relations it reads, so the viewset can
+  # load them up front instead of issuing queries per row.
+  select_related_fields = {}
+  prefetch_related_fields = {}
+
+  def get_eager_loading(self, prefix=''):
+    select_related, prefetch_related = [], []
+    for name, field in self.fields.items():
+      if field.write_only:
+        continue
+      select_related += [prefix + path for path in self.select_related_fields.get(name, [])]
+      prefetch_related += [prefix + path for path in self.prefetch_related_fields.get(name, [])]
+
+      many = isinstance(field, serializers.ListSerializer)
+      child = field.child if many else field
+      if isinstance(child, EagerLoadingMixin) and field.source != '*':
+        nested_prefix = prefix + field.source.replace('.', '__') + '__'
+        nested_select, nested_prefetch = child.get_eager_loading(nested_prefix)
+        if many:
+          prefetch_related += [prefix + field.source.replace('.', '__')] + nested_select + nested_prefetch
+        else:
+          select_related += [prefix + field.source.replace('.', '__')] + nested_select
+          prefetch_related += nested_prefetch
+    return select_related, prefetch_related
+
+  def setup_eager_loading(self, queryset):
+    select_related, prefetch_related = self.get_eager_loading()
+    if select_related:
+      queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+      queryset = queryset.prefetch_related(*prefetch_related)
+    return queryset
+
+def split_paths(value):
+  return {path.strip() for path in (value or '').split(',') if path.strip()}
+
+class SparseFieldsMixin:
+  # ?fields=title,property.title keeps only the named fields, with dotted
+  # paths reaching into nested serializers. Paths in `expandable_fields`
+  # (relative to the declaring serializer) are left out unless named in
+  # ?expand=. Only reads are pruned, so writes always see every field.
+  # Fields are pruned before EagerLoadingMixin walks them, so dropped
+  # relations are never loaded either.
+  expandable_fields = ()
+
+  def get_field_path(self):
+    names = []
+    node = self
+    while node is not None:
+      if node.field_name:
+        names.append(node.field_name)
+      node = node.parent
+    return '.'.join(reversed(names))
+
+  def get_collapsed_fields(self, prefix, expanded):
+    collapsed = set()
+    node = self
+    while node is not None:
+      if isinstance(node, SparseFieldsMixin):
+        node_path = node.get_field_path()
+        node_prefix = node_path + '.' if node_path else ''
+        for path in node.expandable_fields:
+          path = node_prefix + path
+          name = path[len(prefix):]
+          if path.startswith(prefix) and '.' not in name and path not in expanded:
+            collapsed.add(name)
+      node = node.parent
+    return collapsed
+
+  def get_fields(self):
+    fields = super().get_fields()
+    request = self.context.get('request')
+    if request is None or request.method not in ('GET', 'HEAD'):
+      return fields
+
+    requested = split_paths(request.query_params.get('fields'))
+    expanded = split_paths(request.query_params.get('expand'))
+    path = self.get_field_path()
+    prefix = path + '.' if path else ''
+
+    for name in self.get_collapsed_fields(prefix, expanded | requested):
+      fields.pop(name, None)
+
+    selected = {item[len(prefix):].split('.')[0] for item in requested if item.startswith(prefix)}
+    if selected:
+      selected |= {item[len(prefix):].split('.')[0] for item in expanded if item.startswith(prefix)}
+      for name in list(fields):
+        if name not in selected and not fields[name].write_only:
+          del fields[name]
+    return fields
+
+class PropertySerializer(SparseFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
   property_category_name = serializers.SerializerMethodField()
   property_type_name = serializers.SerializerMethodField()
   images = serializers.SerializerMethodField()
+  # Kilometres from the ?near= point, only rendered on near queries
+  distance = serializers.SerializerMethodField()
   uploaded_images = serializers.ListField(
     child=serializers.ImageField(),
     write_only=True,
@@ -18,10 +116,20 @@ class PropertySerializer(serializers.ModelSerializer):
     model = Property
     fields = [
       'id', 'title', 'description', 'price', 'address', 'city', 'status', 'rent_or_buy',
-      'bedroom', 'washroom', 'area', 'property_category', 'property_type',
+      'availability', 'bedroom', 'washroom', 'area', 'latitude', 'longitude', 'distance',
+      'property_category', 'property_type',
       'property_category_name', 'property_type_name', 'created_at', 'updated_at',
       'images', 'uploaded_images'
     ]
+    read_only_fields = ['availability']
+
+  select_related_fields = {
+    'property_category_name': ['property_category'],
+    'property_type_name': ['property_type'],
+  }
+  prefetch_related_fields = {
+    'images': ['property_images'],
+  }
 
   def get_property_category_name(self, obj):
     return obj.property_category.name if obj.property_category else None
@@ -29,8 +137,20 @@ class PropertySerializer(serializers.ModelSerializer):
   def get_property_type_name(self, obj):
     return obj.property_type.name if obj.property_type else None
 
+  def get_fields(self):
+    fields = super().get_fields()
+    request = self.context.get('request')
+    # Only the property list and detail annotate it, and only on ?near=
+    if not (request and request.query_params.get('near')) or self.get_field_path():
+      fields.pop('distance', None)
+    return fields
+
+  def get_distance(self, obj):
+    distance = getattr(obj, 'distance', None)
+    return round(distance, 3) if distance is not None else None
+
   def get_images(self, obj):
-    return PropertyImageSerializer(obj.property_images.all(), many=True).data
+    return PropertyImageSerializer(obj.property_images.all(), many=True, context=self.context).data
 
   def create(self, validated_data):
     uploaded_images = validated_data.pop('uploaded_images', [])
@@ -62,6 +182,63 @@ class PropertySerializer(serializers.ModelSerializer):
     return instance
 
 
+class PropertyListSerializer(PropertySerializer):
+  # Card representation for list responses. The cover image and its
+  # variants come from one correlated subquery instead of prefetching every
+  # image row; description and the full image list are available through
+  # ?expand=description,images.
+  cover_image = serializers.SerializerMethodField()
+  cover_srcset = serializers.SerializerMethodField()
+
+  class Meta(PropertySerializer.Meta):
+    fields = [
+      'id', 'title', 'description', 'price', 'city', 'rent_or_buy', 'availability',
+      'bedroom', 'washroom', 'area', 'latitude', 'longitude', 'distance',
+      'property_category', 'property_type', 'property_category_name', 'property_type_name',
+      'cover_image', 'cover_srcset', 'created_at', 'images'
+    ]
+
+  expandable_fields = ('description', 'images')
+
+  def setup_eager_loading(self, queryset):
+    queryset = super().setup_eager_loading(queryset)
+    if 'description' not in self.fields:
+      queryset = queryset.defer('description')
+    if 'cover_image' in self.fields or 'cover_srcset' in self.fields:
+      cover = (
+        PropertyImage.objects
+        .filter(property=OuterRef('pk'))
+        .order_by('created_at', 'id')
+        .values(cover=JSONObject(image='image', variants='variants'))[:1]
+      )
+      queryset = queryset.annotate(cover=Subquery(cover, output_field=JSONField()))
+    return queryset
+
+  def get_cover(self, obj):
+    if not hasattr(obj, '_cover_image'):
+      cover = getattr(obj, 'cover', None) or {}
+      obj._cover_image = None
+      if cover.get('image'):
+        variants = cover.get('variants') or {}
+        # SQLite nests the JSON column as text
+        if isinstance(variants, str):
+          variants = json.loads(variants)
+        obj._cover_image = PropertyImage(image=cover['image'], variants=variants)
+    return obj._cover_image
+
+  def get_cover_image(self, obj):
+    cover = self.get_cover(obj)
+    if cover is None:
+      return None
+    url = cover.image.url
+    request = self.context.get('request')
+    return request.build_absolute_uri(url) if request is not None else url
+
+  def get_cover_srcset(self, obj):
+    cover = self.get_cover(obj)
+    return get_srcset(cover, self.context.get('request')) if cover is not None else {}
+
+
 class PropertyCategorySerializer(serializers.ModelSerializer):
   class Meta:
     model = PropertyCategory
@@ -71,7 +248,7 @@ class PropertyTypeSerializer(serializers.ModelSerializer):
   class Meta:
     model = PropertyType
     fields = '__all__'
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(SparseFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
   user = serializers.SerializerMethodField(read_only=True)
   user_id = serializers.PrimaryKeyRelatedField(
     queryset=User.objects.all(),
@@ -84,6 +261,13 @@ class CustomerSerializer(serializers.ModelSerializer):
     model = Customer
     fields = '__all__'
 
+  select_related_fields = {
+    'user': ['user'],
+  }
+  prefetch_related_fields = {
+    'agreements': ['agreements__property'],
+  }
+
   def get_user(self, obj):
     user = obj.user
     return {
@@ -117,7 +301,32 @@ class CustomerSerializer(serializers.ModelSerializer):
     except Exception:
       return []
 
-class AgreementSerializer(serializers.ModelSerializer):
+class CustomerSummarySerializer(CustomerSerializer):
+  # ?view=summary: agreement counts per status instead of the agreement
+  # bodies, counted in the customer query itself.
+  agreements = None
+  agreement_count = serializers.IntegerField(read_only=True)
+  agreement_counts = serializers.SerializerMethodField()
+
+  def setup_eager_loading(self, queryset):
+    queryset = super().setup_eager_loading(queryset)
+    if 'agreement_count' in self.fields or 'agreement_counts' in self.fields:
+      queryset = queryset.annotate(
+        agreement_count=Count('agreements'),
+        **{
+          f'{status}_agreement_count': Count('agreements', filter=Q(agreements__status=status))
+          for status, _ in Agreement.STATUS_CHOICES
+        }
+      )
+    return queryset
+
+  def get_agreement_counts(self, obj):
+    return {
+      status: getattr(obj, f'{status}_agreement_count', 0)
+      for status, _ in Agreement.STATUS_CHOICES
+    }
+
+class AgreementSerializer(SparseFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
   # Nested serializers for related fields
   property = PropertySerializer(read_only=True)
   property_id = serializers.PrimaryKeyRelatedField(
@@ -147,6 +356,13 @@ class AgreementSerializer(serializers.ModelSerializer):
     model = Agreement
     fields = '__all__'
 
+  # The property's images and the customer's own agreement list are heavy
+  # and rarely shown next to an agreement; ask for them with ?expand=
+  expandable_fields = ('property.images', 'customer.agreements')
+  select_related_fields = {
+    'user_details': ['customer__user'],
+  }
+
   def get_customer(self, obj):
     customer = obj.customer
     return {
@@ -156,22 +372,62 @@ class AgreementSerializer(serializers.ModelSerializer):
       'address': customer.address
     }
 
+  def validate(self, data):
+    # Status only moves through the transition actions, which lock the property
+    instance = self.instance
+    current_status = getattr(instance, 'status', 'pending')
+    if 'status' in data and data['status'] != current_status:
+      raise serializers.ValidationError({'status': 'Use the approve, activate, complete and cancel actions to change the status.'})
+
+    # Partial updates fall back to the stored values
+    start = data.get('rent_start_date', getattr(instance, 'rent_start_date', None))
+    end = data.get('rent_end_date', getattr(instance, 'rent_end_date', None))
+    if start is None or end is None:
+      return data
+    if end < start:
+      raise serializers.ValidationError({'rent_end_date': 'Rent end date cannot be before the start date.'})
+
+    property_id = data['property'].pk if 'property' in data else getattr(instance, 'property_id', None)
+    if current_status in Agreement.BOOKING_STATUSES and property_id is not None:
+      clashes = Agreement.bookings([property_id], start, end)
+      if instance is not None:
+        clashes = clashes.exclude(pk=instance.pk)
+      clash = clashes.order_by('rent_start_date').values('id', 'rent_start_date', 'rent_end_date').first()
+      if clash:
+        raise serializers.ValidationError({
+          'rent_start_date': (
+            f"The property is already booked from {clash['rent_start_date']} to "
+            f"{clash['rent_end_date']} (agreement {clash['id']})."
+          )
+        })
+    return data
+
 class PropertyImageSerializer(serializers.ModelSerializer):
+  srcset = serializers.SerializerMethodField()
+
   class Meta:
     model = PropertyImage
-    fields = ['id', 'image', 'created_at']
+    fields = ['id', 'image', 'srcset', 'variants_status', 'created_at']
 
-class PaymentSerializer(serializers.ModelSerializer):
+  def get_srcset(self, obj):
+    # {format: "url 320w, url 640w, ..."}, empty until variants are ready
+    return get_srcset(obj, self.context.get('request')) if obj.image else {}
+
+class PaymentSerializer(SparseFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     agreement_details = serializers.SerializerMethodField(read_only=True)
     
     class Meta:
         model = Payment
         fields = [
             'id', 'agreement', 'status', 'method', 
-            'amount', 'date', 'created_at', 'updated_at',
+            'amount', 'date', 'due_date', 'created_at', 'updated_at',
             'agreement_details'
         ]
-        read_only_fields = ['date']  # Date is set automatically when status changes
+        read_only_fields = ['date', 'due_date']  # Date is set automatically when status changes
+
+    select_related_fields = {
+        'agreement_details': ['agreement__property', 'agreement__customer__user'],
+    }
 
     def get_agreement_details(self, obj):
         return {
@@ -188,7 +444,7 @@ class PaymentSerializer(serializers.ModelSerializer):
             }
         }
 
-class UtilityBillSerializer(serializers.ModelSerializer):
+class UtilityBillSerializer(SparseFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     agreement_details = serializers.SerializerMethodField(read_only=True)
     
     class Meta:
@@ -200,6 +456,10 @@ class UtilityBillSerializer(serializers.ModelSerializer):
             'agreement_details'
         ]
 
+    select_related_fields = {
+        'agreement_details': ['agreement__property', 'agreement__customer__user'],
+    }
+
     def get_agreement_details(self, obj):
         return {
             'id': obj.agreement.id,
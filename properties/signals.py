@@ -0,0 +1,177 @@
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+
+from account.models import User
+from .models import Property, Agreement, PropertyImage, PropertyCategory, PropertyType, Customer, Payment, UtilityBill, DashboardCounters
+from .search import index_properties, unindex_property
+from .autocomplete import prefix_index
+from .cache import invalidate_generation
+from .images import schedule_variants
+from . import rollups
+from .live import broker, publish_on_commit
+from .storage import release, release_field_files, replaced_field_files
+
+
+@receiver(post_save, sender=Property)
+def update_property_search_index(sender, instance, using, **kwargs):
+  index_properties([instance], using=using)
+
+
+@receiver(post_delete, sender=Property)
+def remove_property_search_index(sender, instance, using, **kwargs):
+  unindex_property(instance.pk, using=using)
+
+
+@receiver(post_save, sender=Property)
+def update_property_autocomplete(sender, instance, using, **kwargs):
+  # The index lives in memory, so only apply changes that committed
+  transaction.on_commit(lambda: prefix_index.update(
+    instance.pk, instance.title, instance.address, instance.city, instance.property_type_id
+  ), using=using)
+
+
+@receiver(post_delete, sender=Property)
+def remove_property_autocomplete(sender, instance, using, **kwargs):
+  property_id = instance.pk
+  transaction.on_commit(lambda: prefix_index.remove(property_id), using=using)
+
+
+@receiver(post_save, sender=PropertyType)
+@receiver(post_delete, sender=PropertyType)
+def reset_property_autocomplete(sender, using, **kwargs):
+  transaction.on_commit(prefix_index.refresh, using=using)
+
+
+@receiver(post_delete, sender=Agreement)
+def refresh_property_availability(sender, instance, using, origin=None, **kwargs):
+  # Runs inside the deletion's transaction, including cascades from
+  # Customer. Properties deleted in the same operation are skipped.
+  if isinstance(origin, Property) and origin.pk == instance.property_id:
+    return
+  if isinstance(origin, QuerySet) and origin.model is Property and origin.filter(pk=instance.property_id).exists():
+    return
+  property_instance = Property.objects.using(using).filter(pk=instance.property_id).first()
+  if property_instance:
+    property_instance.refresh_availability()
+
+
+@receiver(pre_save, sender=Property)
+@receiver(pre_delete, sender=Property)
+def remember_property_counts(sender, instance, using, **kwargs):
+  # The stored row, not the instance, says what the counters hold now
+  previous = None
+  if not instance._state.adding:
+    previous = Property.objects.using(using).filter(pk=instance.pk).values_list('availability', 'status').first()
+  instance._dashboard_counts = DashboardCounters.property_counts(*previous) if previous else None
+
+
+@receiver(post_save, sender=Property)
+def update_property_counts(sender, instance, using, **kwargs):
+  new = DashboardCounters.property_counts(instance.availability, instance.status)
+  DashboardCounters.apply(getattr(instance, '_dashboard_counts', None), new, using=using)
+
+
+@receiver(post_delete, sender=Property)
+def remove_property_counts(sender, instance, using, **kwargs):
+  DashboardCounters.apply(getattr(instance, '_dashboard_counts', None), using=using)
+
+
+@receiver(pre_save, sender=Agreement)
+@receiver(pre_delete, sender=Agreement)
+def remember_agreement_counts(sender, instance, using, **kwargs):
+  previous = None
+  if not instance._state.adding:
+    previous = Agreement.objects.using(using).filter(pk=instance.pk).values_list('status', flat=True).first()
+  instance._dashboard_counts = DashboardCounters.agreement_counts(previous) if previous else None
+
+
+@receiver(post_save, sender=Agreement)
+def update_agreement_counts(sender, instance, using, **kwargs):
+  old = getattr(instance, '_dashboard_counts', None)
+  new = DashboardCounters.agreement_counts(instance.status)
+  DashboardCounters.apply(old, new, using=using)
+
+  # The payload costs queries, so only build it when an admin is listening
+  if new['pending_requests'] and not (old and old['pending_requests']) and broker.has_subscribers():
+    publish_on_commit('pending_agreement', {
+      'id': instance.pk,
+      'property_id': instance.property_id,
+      'property_title': instance.property.title,
+      'customer_id': instance.customer_id,
+      'customer_name': instance.customer.user.name,
+      'created_at': instance.created_at,
+    }, using=using)
+
+
+@receiver(post_delete, sender=Agreement)
+def remove_agreement_counts(sender, instance, using, **kwargs):
+  DashboardCounters.apply(getattr(instance, '_dashboard_counts', None), using=using)
+
+
+@receiver(pre_save, sender=Payment)
+@receiver(pre_save, sender=UtilityBill)
+@receiver(pre_delete, sender=Payment)
+@receiver(pre_delete, sender=UtilityBill)
+def remember_rollup_entry(sender, instance, using, **kwargs):
+  instance._rollup_entry = None
+  if instance.pk is not None and not instance._state.adding:
+    instance._rollup_entry = rollups.SPECS[sender].read_entry(instance.pk, using=using)
+
+
+@receiver(post_save, sender=Payment)
+@receiver(post_save, sender=UtilityBill)
+def update_rollup_entry(sender, instance, using, **kwargs):
+  spec = rollups.SPECS[sender]
+  rollups.apply(spec, getattr(instance, '_rollup_entry', None), spec.read_entry(instance.pk, using=using), using=using)
+
+
+@receiver(post_delete, sender=Payment)
+@receiver(post_delete, sender=UtilityBill)
+def remove_rollup_entry(sender, instance, using, **kwargs):
+  rollups.apply(rollups.SPECS[sender], getattr(instance, '_rollup_entry', None), using=using)
+
+
+@receiver(post_save, sender=PropertyImage)
+def generate_property_image_variants(sender, instance, created, using, **kwargs):
+  if created:
+    schedule_variants(instance.pk, using=using)
+
+
+def release_stored_files(sender, instance, using, **kwargs):
+  def release_files():
+    release_field_files(instance)
+    if isinstance(instance, PropertyImage) and instance.image:
+      for widths in (instance.variants or {}).values():
+        for name in widths.values():
+          release(instance.image.storage, name)
+
+  transaction.on_commit(release_files, using=using)
+
+
+def remember_replaced_files(sender, instance, using, update_fields=None, **kwargs):
+  instance._replaced_files = replaced_field_files(instance, using=using, update_fields=update_fields)
+
+
+def release_replaced_files(sender, instance, using, **kwargs):
+  replaced = getattr(instance, '_replaced_files', None)
+  if replaced:
+    transaction.on_commit(lambda: [release(storage, name) for storage, name in replaced], using=using)
+
+
+# Models with file fields in the content-addressed storage
+for model in (PropertyImage, Agreement, UtilityBill, User):
+  pre_save.connect(remember_replaced_files, sender=model, dispatch_uid=f'remember_{model._meta.label_lower}_files')
+  post_save.connect(release_replaced_files, sender=model, dispatch_uid=f'replace_{model._meta.label_lower}_files')
+  post_delete.connect(release_stored_files, sender=model, dispatch_uid=f'release_{model._meta.label_lower}_files')
+
+
+def invalidate_cached_responses(sender, using, **kwargs):
+  invalidate_generation(sender._meta.model_name, using=using)
+
+
+# Models whose changes show up in cached or conditionally served responses
+for model in (Property, PropertyImage, PropertyCategory, PropertyType, Agreement, Customer, Payment, UtilityBill, User):
+  post_save.connect(invalidate_cached_responses, sender=model, dispatch_uid=f'invalidate_{model._meta.label_lower}_save')
+  post_delete.connect(invalidate_cached_responses, sender=model, dispatch_uid=f'invalidate_{model._meta.label_lower}_delete')
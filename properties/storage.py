@@ -0,0 +1,121 @@
+import hashlib
+import os
+
+from django.core.files.storage import FileSystemStorage
+from django.db import IntegrityError, transaction
+from django.db.models import F, FileField
+from django.views.static import serve
+
+# Uploads are stored under their SHA-256, so the same photo or receipt
+# uploaded many times is kept on disk once. StoredFile rows count the
+# references; deleting a field's file only removes it from disk when the
+# last reference goes. Names never change content, so they are served
+# with far-future cache headers.
+CAS_PREFIX = 'cas/'
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def is_content_addressed(name):
+  return bool(name) and name.startswith(CAS_PREFIX)
+
+
+def hash_content(content):
+  digest = hashlib.sha256()
+  size = 0
+  for chunk in content.chunks(HASH_CHUNK_SIZE):
+    digest.update(chunk)
+    size += len(chunk)
+  content.seek(0)
+  return digest.hexdigest(), size
+
+
+def content_addressed_name(digest, original_name):
+  extension = os.path.splitext(original_name)[1].lower()
+  return f'{CAS_PREFIX}{digest[:2]}/{digest}{extension}'
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+  def save(self, name, content, max_length=None):
+    if name is None:
+      name = content.name
+    digest, size = hash_content(content)
+    name = content_addressed_name(digest, name)
+    # The reference is taken first, which locks the StoredFile row until the
+    # transaction ends, so a delete() of the last reference can't remove the
+    # file between the exists() check and its reuse. An existing file under
+    # this name has the same bytes.
+    with transaction.atomic():
+      self.add_reference(name, size)
+      if not self.exists(name):
+        super()._save(name, content)
+    return name
+
+  def add_reference(self, name, size=0, count=1):
+    from .models import StoredFile
+
+    with transaction.atomic():
+      try:
+        with transaction.atomic():
+          StoredFile.objects.get_or_create(name=name, defaults={'size': size})
+      except IntegrityError:
+        pass
+      StoredFile.objects.filter(name=name).update(ref_count=F('ref_count') + count)
+
+  def delete(self, name):
+    if not is_content_addressed(name):
+      return super().delete(name)
+
+    from .models import StoredFile
+
+    # The file goes while the row is still locked: a concurrent save() either
+    # took its reference first and the file stays, or waits and writes the
+    # file again
+    with transaction.atomic():
+      StoredFile.objects.filter(name=name, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+      if StoredFile.objects.filter(name=name, ref_count=0).delete()[0]:
+        super().delete(name)
+
+
+def release(storage, name):
+  if isinstance(storage, ContentAddressedStorage) and is_content_addressed(name):
+    storage.delete(name)
+
+
+def release_field_files(instance):
+  # Drop the references held by a deleted instance's file fields
+  for field in instance._meta.fields:
+    if isinstance(field, FileField):
+      release(field.storage, getattr(instance, field.attname).name)
+
+
+def replaced_field_files(instance, using=None, update_fields=None):
+  # (storage, name) of the stored files an update of `instance` replaces or
+  # clears. A new upload with the same bytes gets the same name, but saving
+  # it took another reference, so the old one is still released.
+  fields = [
+    field for field in instance._meta.fields
+    if isinstance(field, FileField) and (update_fields is None or field.name in update_fields)
+  ]
+  if instance._state.adding or instance.pk is None or not fields:
+    return []
+  stored = instance.__class__._base_manager.using(using).filter(pk=instance.pk).values(
+    *[field.attname for field in fields]
+  ).first()
+  if stored is None:
+    return []
+
+  replaced = []
+  for field in fields:
+    previous = stored[field.attname]
+    current = getattr(instance, field.attname)
+    if previous and (not current or current.name != previous or not current._committed):
+      replaced.append((field.storage, previous))
+  return replaced
+
+
+def serve_media(request, path, document_root=None, show_indexes=False):
+  response = serve(request, path, document_root=document_root, show_indexes=show_indexes)
+  if is_content_addressed(path) and response.status_code == 200:
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+  return response
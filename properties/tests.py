@@ -1,3 +1,917 @@
-from django.test import TestCase
+import asyncio
+import csv
+import datetime
+import io
+import json
+import os
+import shutil
+import tempfile
+from decimal import Decimal
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from account.models import User
+from . import geo
+from .autocomplete import prefix_index
+from .cache import changed_key
+from .live import authenticate_admin, broker, read_ticket
+from .models import (
+  Agreement, Customer, DashboardCounters, Payment, PaymentRollup, Property, PropertyCategory,
+  PropertyImage, PropertyType, StoredFile, UtilityBill
+)
+from .schedules import add_months
+from .views import PropertyViewSet
+
+
+def create_property(**kwargs):
+  data = {
+    'title': 'Modern House',
+    'description': 'A cozy house',
+    'price': Decimal('150000.00'),
+    'address': '123 Main St',
+  }
+  data.update(kwargs)
+  return Property.objects.create(**data)
+
+
+class PropertyFilterTests(TestCase):
+  def setUp(self):
+    cache.clear()
+    self.user = User.objects.create_user(email='admin@email.com', name='Admin', password='admin123')
+    self.client = APIClient()
+    self.client.force_authenticate(self.user)
+
+  def get_queryset(self, params):
+    view = PropertyViewSet(action_map={'get': 'list'}, format_kwarg=None, args=(), kwargs={})
+    view.request = view.initialize_request(APIRequestFactory().get('/api/v1/properties/', params))
+    return view.get_queryset()
+
+  def list_titles(self, params):
+    response = self.client.get('/api/v1/properties/', params)
+    self.assertEqual(response.status_code, 200)
+    return sorted(row['title'] for row in response.json()['results'])
+
+  def count_list_queries(self, url, params):
+    with CaptureQueriesContext(connection) as queries:
+      response = self.client.get(url, params)
+    self.assertEqual(response.status_code, 200)
+    return len(queries.captured_queries)
+
+  def test_list_queries_do_not_grow_with_rows(self):
+    category = PropertyCategory.objects.create(name='Residential')
+    house = PropertyType.objects.create(category=category, name='House')
+
+    def add_properties(count):
+      for _ in range(count):
+        item = create_property(property_category=category, property_type=house)
+        PropertyImage.objects.create(property=item, image='properties/front.jpg')
+
+    add_properties(2)
+    few = self.count_list_queries('/api/v1/properties/', {'expand': 'images'})
+    add_properties(8)
+    self.assertEqual(self.count_list_queries('/api/v1/properties/', {'expand': 'images'}), few)
+
+  def test_cursor_pagination_walks_every_row(self):
+    created = [create_property(title=f'House {index}').pk for index in range(5)]
+    Property.objects.filter(pk__in=created).update(created_at=datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc))
+
+    seen = []
+    url, params = '/api/v1/properties/', {'pagination': 'cursor', 'page_size': 2}
+    while url:
+      data = self.client.get(url, params).json()
+      seen += [row['id'] for row in data['results']]
+      url, params = data['next'], {}
+    # Equal created_at values are ordered by id
+    self.assertEqual(seen, sorted(created, reverse=True))
+
+    previous = self.client.get(data['previous']).json()
+    self.assertEqual([row['id'] for row in previous['results']], seen[2:4])
+
+    response = self.client.get('/api/v1/properties/', {'pagination': 'cursor', 'ordering': 'price'})
+    self.assertEqual(response.status_code, 400)
+    response = self.client.get('/api/v1/properties/', {'cursor': 'not-a-cursor'})
+    self.assertEqual(response.status_code, 400)
+
+  def test_cursor_pages_use_index(self):
+    for index in range(3):
+      create_property(title=f'House {index}')
+    first = self.client.get('/api/v1/properties/', {'pagination': 'cursor', 'page_size': 1, 'filter_type': 'all'})
+    with CaptureQueriesContext(connection) as queries:
+      self.client.get(first.json()['next'])
+    page_query = [query['sql'] for query in queries.captured_queries if 'LIMIT' in query['sql']][-1]
+    with connection.cursor() as cursor:
+      cursor.execute(f'EXPLAIN QUERY PLAN {page_query}')
+      plan = ' '.join(str(row) for row in cursor.fetchall())
+    self.assertIn('properties__created_388d9e_idx', plan)
+
+  def test_search_ranks_title_matches_first(self):
+    create_property(title='Garden Villa', description='Large rooms')
+    create_property(title='Quiet flat', description='Overlooks a garden')
+    other = create_property(title='Corner shop', description='Busy road')
+
+    def search(term):
+      response = self.client.get('/api/v1/properties/', {'search': term})
+      return [row['title'] for row in response.json()['results']]
+
+    self.assertEqual(search('gard'), ['Garden Villa', 'Quiet flat'])
+    self.assertEqual(search('garden rooms'), ['Garden Villa'])
+
+    # The index follows saves and deletes
+    other.title = 'Garden shop'
+    other.save()
+    self.assertIn('Garden shop', search('garden'))
+    other.delete()
+    self.assertEqual(search('shop'), [])
+
+  def test_search_matches_once(self):
+    for index in range(5):
+      create_property(title=f'Garden Villa {index}')
+    with CaptureQueriesContext(connection) as queries:
+      self.client.get('/api/v1/properties/', {'search': 'garden'})
+    page_query = [query['sql'] for query in queries.captured_queries if 'LIMIT' in query['sql']][-1]
+    self.assertEqual(page_query.count(' MATCH '), 1)
+    with connection.cursor() as cursor:
+      cursor.execute(f'EXPLAIN QUERY PLAN {page_query}')
+      plan = [row[-1] for row in cursor.fetchall()]
+    # The index drives the join and each match is one primary-key lookup
+    self.assertTrue(plan[0].startswith('SCAN properties_property_fts VIRTUAL TABLE'), plan)
+    self.assertIn('SEARCH properties_property USING INTEGER PRIMARY KEY (rowid=?)', plan)
+
+  def test_price_range_is_numeric(self):
+    create_property(title='cheap', price=Decimal('9000'))
+    create_property(title='mid', price=Decimal('150000'))
+    create_property(title='dear', price=Decimal('1200000'))
+
+    self.assertEqual(self.list_titles({'min_price': '10000', 'max_price': '200000'}), ['mid'])
+    self.assertEqual(self.list_titles({'min_price': '100000'}), ['dear', 'mid'])
+
+    response = self.client.get('/api/v1/properties/', {'ordering': 'price'})
+    self.assertEqual([row['title'] for row in response.json()['results']], ['cheap', 'mid', 'dear'])
+
+  def test_attribute_filters(self):
+    create_property(title='small', city='Lahore', bedroom=1, area=Decimal('500'))
+    create_property(title='large', city='Lahore', bedroom=4, area=Decimal('2000'))
+    create_property(title='elsewhere', city='Sialkot', bedroom=4, area=Decimal('2000'))
+
+    self.assertEqual(self.list_titles({'city': 'Lahore', 'bedrooms': '3'}), ['large'])
+    self.assertEqual(self.list_titles({'min_area': '1000'}), ['elsewhere', 'large'])
+
+  def test_invalid_number_is_rejected(self):
+    for params in (
+      {'min_price': 'cheap'}, {'min_price': 'NaN'}, {'max_price': '-Infinity'}, {'min_area': 'sNaN'},
+      {'min_price': '1e999999'}, {'bedrooms': '2.5'},
+    ):
+      response = self.client.get('/api/v1/properties/', params)
+      self.assertEqual(response.status_code, 400, params)
+    self.assertEqual(self.client.get('/api/v1/properties/', {'bedrooms': '2.0'}).status_code, 200)
+
+  def test_price_range_uses_index(self):
+    plan = self.get_queryset({
+      'type': 'rent', 'city': 'Lahore', 'min_price': '1000', 'max_price': '5000'
+    }).explain()
+    self.assertIn('properties__rent_or_d4f465_idx', plan)
+
+  def test_category_and_type_use_index(self):
+    category = PropertyCategory.objects.create(name='Residential')
+    property_type = PropertyType.objects.create(category=category, name='House')
+    plan = self.get_queryset({'category_id': category.id, 'type_id': property_type.id}).explain()
+    self.assertIn('properties__propert_32ad7d_idx', plan)
+
+  def test_facets_count_current_filter_set(self):
+    category = PropertyCategory.objects.create(name='Residential')
+    house = PropertyType.objects.create(category=category, name='House')
+    create_property(city='Lahore', rent_or_buy='rent', bedroom=2, property_category=category, property_type=house)
+    create_property(city='Lahore', rent_or_buy='buy', bedroom=3, property_category=category, property_type=house)
+    create_property(city='Sialkot', rent_or_buy='rent', bedroom=2)
+
+    with self.assertNumQueries(1):
+      response = self.client.get('/api/v1/properties/facets/', {'city': 'Lahore'})
+    self.assertEqual(response.status_code, 200)
+    data = response.json()
+    self.assertEqual(data['total'], 2)
+    self.assertEqual(data['category'], [{'id': category.id, 'name': 'Residential', 'count': 2}])
+    self.assertEqual(data['rent_or_buy'], [{'value': 'buy', 'count': 1}, {'value': 'rent', 'count': 1}])
+    self.assertEqual(data['bedroom'], [{'value': 2, 'count': 1}, {'value': 3, 'count': 1}])
+
+    response = self.client.get('/api/v1/properties/facets/', {'city': 'Lahore', 'page': '2'})
+    self.assertEqual(response['X-Cache'], 'HIT')
+
+  def test_cached_responses_follow_saves(self):
+    house = create_property(title='House')
+    customer = Customer.objects.create(user=self.user, cnic='12345', phone_number='03001234567', address='Street 1')
+
+    def cache_status(url):
+      return self.client.get(url)['X-Cache']
+
+    changes = [
+      lambda: house.save(),
+      lambda: PropertyImage.objects.create(property=house, image='properties/front.jpg'),
+      lambda: Agreement.objects.create(property=house, customer=customer),
+    ]
+    for change in changes:
+      for url in ('/api/v1/properties/', f'/api/v1/properties/{house.pk}/'):
+        cache_status(url)
+        self.assertEqual(cache_status(url), 'HIT')
+        change()
+        self.assertEqual(cache_status(url), 'MISS')
+
+  def test_list_is_compact_with_cover_image(self):
+    house = create_property(title='house')
+    PropertyImage.objects.create(property=house, image='properties/first.jpg')
+    PropertyImage.objects.create(property=house, image='properties/second.jpg')
+
+    with CaptureQueriesContext(connection) as queries:
+      response = self.client.get('/api/v1/properties/')
+    row = response.json()['results'][0]
+    self.assertTrue(row['cover_image'].endswith('/media/properties/first.jpg'))
+    self.assertNotIn('images', row)
+    self.assertNotIn('description', row)
+    self.assertFalse(any(
+      query['sql'].startswith('SELECT "properties_propertyimage"') for query in queries.captured_queries
+    ))
+
+    response = self.client.get(f'/api/v1/properties/{house.id}/')
+    self.assertEqual(len(response.json()['images']), 2)
+
+  def test_autocomplete_follows_saves(self):
+    prefix_index.reset()
+    create_property(title='Garden Villa', city='Lahore')
+    response = self.client.get('/api/v1/properties/autocomplete/', {'q': 'gard'})
+    self.assertEqual([row['text'] for row in response.json()['results']], ['Garden Villa'])
+
+    with self.captureOnCommitCallbacks(execute=True):
+      house = create_property(title='Lakeside Cottage', city='Lahore')
+    suggestions = self.client.get('/api/v1/properties/autocomplete/', {'q': 'lak'}).json()['results']
+    self.assertEqual(suggestions[0]['property_id'], house.id)
+    self.assertEqual(self.client.get('/api/v1/properties/autocomplete/', {'q': 'cottage'}).json()['results'][0]['text'], 'Lakeside Cottage')
+
+    with self.captureOnCommitCallbacks(execute=True):
+      house.delete()
+    self.assertEqual(self.client.get('/api/v1/properties/autocomplete/', {'q': 'lak'}).json()['results'], [])
+
+  def test_import_command_reports_bad_rows(self):
+    category = PropertyCategory.objects.create(name='Residential')
+    PropertyType.objects.create(category=category, name='House')
+    rows = (
+      '\ufeff Title ,Description,Price,Address,Category,Type\n'
+      'Garden Villa,Big garden,250000,1 Park Rd,residential,house\n'
+      'Cheap Flat,Small,not a price,2 Park Rd,Residential,House\n'
+      'Shed,Tiny,1000,3 Park Rd,Industrial,\n'
+    )
+    path = os.path.join(tempfile.mkdtemp(), 'rows.csv')
+    self.addCleanup(shutil.rmtree, os.path.dirname(path))
+    with open(path, 'w', encoding='utf-8') as file:
+      file.write(rows)
+
+    stderr = io.StringIO()
+    call_command('import_properties', path, '--batch-size', '1', stdout=io.StringIO(), stderr=stderr)
+    house = Property.objects.get()
+    self.assertEqual((house.title, house.price, house.property_type.name), ('Garden Villa', Decimal('250000'), 'House'))
+    self.assertIn('Row 3: {"price"', stderr.getvalue())
+    self.assertIn('Row 4: {"category"', stderr.getvalue())
+
+  def test_import_endpoint_accepts_ndjson(self):
+    self.user.is_admin = True
+    self.user.save()
+    lines = '\n'.join([
+      '{"title": "Garden Villa", "description": "Big garden", "price": "250000", "address": "1 Park Rd"}',
+      '{"title": "Broken"',
+      '["not", "an", "object"]',
+      '',
+      '{"title": "Lake House", "description": "Lakeside", "price": "-5", "address": "2 Lake Rd"}',
+    ])
+    upload = ContentFile(lines.encode(), name='rows.ndjson')
+    response = self.client.post('/api/v1/properties/import/', {'file': upload}, format='multipart')
+    self.assertEqual(response.status_code, 200)
+    self.assertEqual(response.json()['created'], 1)
+    self.assertEqual([error['row'] for error in response.json()['errors']], [2, 3, 5])
+    self.assertEqual(list(Property.objects.values_list('title', flat=True)), ['Garden Villa'])
+
+    upload = ContentFile(b'title\n\xff\xfe', name='rows.csv')
+    response = self.client.post('/api/v1/properties/import/', {'file': upload}, format='multipart')
+    self.assertEqual(response.status_code, 400)
+
+  def test_geohash_encode_and_cover(self):
+    self.assertEqual(geo.encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+
+    cells = geo.cover(31.40, 74.20, 31.60, 74.50)
+    self.assertLessEqual(len(cells), geo.MAX_COVER_CELLS)
+    for step in range(11):
+      latitude = 31.40 + step * 0.02
+      for longitude in (74.20, 74.27, 74.35, 74.42, 74.50):
+        point = geo.encode(latitude, longitude)
+        self.assertTrue(any(point.startswith(cell) for cell in cells), (latitude, longitude))
+
+    self.assertEqual(geo.split_box(-18, 179, -16, -179), [(-18, 179, -16, 180.0), (-18, -180.0, -16, -179)])
+    self.assertEqual(geo.split_box(-18, 178, -16, 181), [(-18, 178, -16, 180.0), (-18, -180.0, -16, -179.0)])
+
+  def test_near_and_bbox_filters(self):
+    create_property(title='Centre', latitude=Decimal('31.5204'), longitude=Decimal('74.3587'))
+    create_property(title='One km north', latitude=Decimal('31.5294'), longitude=Decimal('74.3587'))
+    create_property(title='Far', latitude=Decimal('31.6000'), longitude=Decimal('74.3600'))
+    create_property(title='Unmapped')
+
+    response = self.client.get('/api/v1/properties/', {'near': '31.5204,74.3587', 'radius': '2'})
+    rows = response.json()['results']
+    self.assertEqual([row['title'] for row in rows], ['Centre', 'One km north'])
+    self.assertEqual(rows[0]['distance'], 0)
+    self.assertAlmostEqual(rows[1]['distance'], 1.0, delta=0.01)
+    self.assertNotIn('distance', self.client.get('/api/v1/properties/').json()['results'][0])
+
+    for radius in ('0', '-1'):
+      response = self.client.get('/api/v1/properties/', {'near': '31.5204,74.3587', 'radius': radius})
+      self.assertEqual(response.status_code, 400)
+    self.assertEqual(self.client.get('/api/v1/properties/', {'near': '31.5'}).status_code, 400)
+
+    self.assertEqual(self.list_titles({'bbox': '74.35,31.51,74.37,31.53'}), ['Centre', 'One km north'])
+
+  def test_map_filters_cross_the_antimeridian(self):
+    create_property(title='East', latitude=Decimal('-17.0000'), longitude=Decimal('179.9900'))
+    create_property(title='West', latitude=Decimal('-17.0000'), longitude=Decimal('-179.9900'))
+    create_property(title='Elsewhere', latitude=Decimal('-17.0000'), longitude=Decimal('178.0000'))
+
+    self.assertEqual(self.list_titles({'near': '-17,179.99', 'radius': '5'}), ['East', 'West'])
+    self.assertEqual(self.list_titles({'near': '-17,-179.99', 'radius': '5'}), ['East', 'West'])
+    self.assertEqual(self.list_titles({'bbox': '179.9,-17.1,-179.9,-16.9'}), ['East', 'West'])
+
+  def test_export_streams_filtered_rows(self):
+    category = PropertyCategory.objects.create(name='Residential')
+    flat = create_property(title='Flat, top floor', rent_or_buy='rent', property_category=category)
+    create_property(title='Villa', rent_or_buy='buy')
+
+    response = self.client.get('/api/v1/properties/export/', {'type': 'rent'})
+    self.assertEqual(response.status_code, 200)
+    self.assertTrue(response.streaming)
+    self.assertTrue(response['Content-Disposition'].endswith('.csv"'))
+    rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+    self.assertEqual(len(rows), 1)
+    self.assertEqual(
+      (rows[0]['id'], rows[0]['title'], rows[0]['price'], rows[0]['property_category_name']),
+      (str(flat.id), 'Flat, top floor', '150000.00', 'Residential')
+    )
+
+    response = self.client.get('/api/v1/properties/export/', {'export_format': 'ndjson'})
+    rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+    self.assertEqual(sorted(row['title'] for row in rows), ['Flat, top floor', 'Villa'])
+    self.assertEqual({row['price'] for row in rows}, {'150000.00'})
+
+    response = self.client.get('/api/v1/properties/export/', {'export_format': 'xml'})
+    self.assertEqual(response.status_code, 400)
+
+
+class AgreementTestCase(TestCase):
+  def setUp(self):
+    cache.clear()
+    self.user = User.objects.create_user(email='admin@email.com', name='Admin', password='admin123')
+    self.user.is_admin = True
+    self.user.save()
+    self.client = APIClient()
+    self.client.force_authenticate(self.user)
+
+    customer = Customer.objects.create(user=self.user, cnic='12345', phone_number='03001234567', address='Street 1')
+    for index in range(3):
+      Agreement.objects.create(
+        property=create_property(title=f'House {index}'),
+        customer=customer,
+        rent_amount=Decimal('1000'),
+        rent_start_date=datetime.date(2024, 1, 1),
+        rent_end_date=datetime.date(2024, 12, 31),
+      )
+
+
+class SparseFieldsTests(AgreementTestCase):
+  def get_agreements(self, params):
+    with CaptureQueriesContext(connection) as queries:
+      response = self.client.get('/api/v1/agreements/', params)
+    self.assertEqual(response.status_code, 200)
+    touched_images = any('properties_propertyimage' in query['sql'] for query in queries.captured_queries)
+    return response.json()['results'], touched_images
+
+  def test_agreements_skip_images_unless_expanded(self):
+    results, touched_images = self.get_agreements({})
+    self.assertNotIn('images', results[0]['property'])
+    self.assertNotIn('agreements', results[0]['customer'])
+    self.assertFalse(touched_images)
+
+    results, touched_images = self.get_agreements({'expand': 'property.images'})
+    self.assertEqual(results[0]['property']['images'], [])
+    self.assertTrue(touched_images)
+
+  def test_fields_prune_nested_serializers(self):
+    results, _ = self.get_agreements({'fields': 'id,property.title'})
+    self.assertEqual(set(results[0]), {'id', 'property'})
+    self.assertEqual(set(results[0]['property']), {'title'})
+
+
+class AgreementTests(AgreementTestCase):
+  def test_availability_follows_agreements(self):
+    agreement = Agreement.objects.first()
+    house = agreement.property
+    self.assertEqual(Property.objects.get(pk=house.pk).availability, 'pending')
+
+    agreement.status = 'active'
+    agreement.save()
+    self.assertEqual(Property.objects.get(pk=house.pk).availability, 'sold')
+
+    # A rented property with a future booking stays out of filter_type=pending
+    house.rent_or_buy = 'rent'
+    house.save()
+    Agreement.objects.create(
+      property=house, customer=agreement.customer,
+      rent_start_date=datetime.date(2025, 1, 1), rent_end_date=datetime.date(2025, 12, 31)
+    )
+    self.assertEqual(Property.objects.get(pk=house.pk).availability, 'rented')
+    pending = self.client.get('/api/v1/properties/', {'filter_type': 'pending'}).json()['results']
+    self.assertNotIn(house.pk, [row['id'] for row in pending])
+
+    # Moving an agreement refreshes both properties
+    other = Agreement.objects.exclude(property=house).first()
+    other.property = house
+    other.save()
+    self.assertEqual(Property.objects.filter(availability='available').count(), 1)
+
+    Agreement.objects.filter(property=house).delete()
+    self.assertEqual(Property.objects.get(pk=house.pk).availability, 'available')
+
+  def test_rebuild_availability(self):
+    Property.objects.update(availability='sold')
+    call_command('rebuild_availability', stdout=io.StringIO())
+    self.assertEqual(set(Property.objects.values_list('availability', flat=True)), {'pending'})
+    self.assertEqual(DashboardCounters.current(), DashboardCounters.compute())
+
+  def test_conditional_gets(self):
+    agreement = Agreement.objects.first()
+    Payment.objects.create(agreement=agreement, amount=Decimal('1000'))
+    urls = ('/api/v1/agreements/', f'/api/v1/agreements/{agreement.pk}/', '/api/v1/payments/')
+    etags = {url: self.client.get(url)['ETag'] for url in urls}
+    for url, etag in etags.items():
+      self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    # Cached property responses answer from the stored validators
+    url = f'/api/v1/properties/{agreement.property_id}/'
+    etag = self.client.get(url)['ETag']
+    with self.assertNumQueries(0):
+      self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    # Nested data: the payment rows are unchanged but their agreement is not
+    agreement.rent_amount = Decimal('1200')
+    agreement.save()
+    for url, etag in etags.items():
+      self.assertNotEqual(self.client.get(url)['ETag'], etag)
+
+    etags = {url: self.client.get(url)['ETag'] for url in urls}
+    self.user.name = 'Renamed'
+    self.user.save()
+    self.assertNotEqual(self.client.get(urls[0])['ETag'], etags[urls[0]])
+
+    # Deleting an older bill leaves MAX(updated_at) as it was, but not the
+    # time bills last changed
+    bills = [
+      UtilityBill.objects.create(
+        agreement=agreement, bill_type='gas', bill_amount=Decimal('80'),
+        bill_date=datetime.date(2024, month, 1), due_date=datetime.date(2024, month, 15)
+      ) for month in (1, 2)
+    ]
+    for month, bill in enumerate(bills, 1):
+      UtilityBill.objects.filter(pk=bill.pk).update(
+        updated_at=datetime.datetime(2024, month, 1, tzinfo=datetime.timezone.utc)
+      )
+    long_ago = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc).timestamp()
+    cache.set_many({
+      changed_key(name): long_ago for name in ('utilitybill', 'agreement', 'property', 'customer', 'user')
+    }, timeout=None)
+    url = '/api/v1/utility-bills/'
+    last_modified = self.client.get(url)['Last-Modified']
+    self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+    bills[0].delete()
+    self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 200)
+
+  def test_customer_agreements_load_in_bounded_queries(self):
+    other = User.objects.create_user(email='other@email.com', name='Other', password='other123')
+    Customer.objects.create(user=other, cnic='67890', phone_number='03007654321', address='Street 2')
+
+    # Count, customers with users, agreements, their properties
+    with self.assertNumQueries(4):
+      response = self.client.get('/api/v1/customers/')
+    self.assertEqual(len(response.json()['results'][1]['agreements']), 3)
+
+    with self.assertNumQueries(2):
+      response = self.client.get('/api/v1/customers/active_customers/', {'view': 'summary'})
+    data = response.json()
+    self.assertEqual(data['count'], 1)
+    self.assertNotIn('agreements', data['results'][0])
+    self.assertEqual(data['results'][0]['agreement_count'], 3)
+    self.assertEqual(data['results'][0]['agreement_counts']['pending'], 3)
+
+  def test_bookings_cannot_overlap(self):
+    agreement = Agreement.objects.first()
+    data = {
+      'property_id': agreement.property_id,
+      'customer_id': agreement.customer_id,
+      'rent_start_date': '2024-12-01',
+      'rent_end_date': '2025-02-28',
+    }
+    response = self.client.post('/api/v1/agreements/', data, format='json')
+    self.assertEqual(response.status_code, 400)
+    self.assertIn('rent_start_date', response.json())
+
+    data['rent_start_date'] = '2025-01-01'
+    response = self.client.post('/api/v1/agreements/', data, format='json')
+    self.assertEqual(response.status_code, 201)
+
+    with self.assertNumQueries(1):
+      response = self.client.get('/api/v1/properties/calendar/', {
+        'ids': f'{agreement.property_id},{agreement.property_id + 100}',
+        'start': '2024-11-01',
+        'end': '2025-03-31',
+      })
+    booked, free = response.json()['results']
+    self.assertEqual([item['start'] for item in booked['booked']], ['2024-01-01', '2025-01-01'])
+    self.assertEqual(booked['free'], [{'start': '2025-03-01', 'end': '2025-03-31'}])
+    self.assertEqual(free['free'], [{'start': '2024-11-01', 'end': '2025-03-31'}])
+
+  def test_rent_schedule_is_generated_once(self):
+    agreement = Agreement.objects.first()
+    Property.objects.filter(pk=agreement.property_id).update(rent_or_buy='rent')
+    agreement.status = 'active'
+    agreement.save()
+
+    response = self.client.post('/api/v1/payments/generate_schedule/', {}, format='json')
+    self.assertEqual(response.json(), {'agreements': 1, 'payments': 12, 'updated': 0, 'removed': 0})
+    payments = Payment.objects.filter(agreement=agreement)
+    self.assertEqual(payments.filter(status='pending', amount=Decimal('1000')).count(), 12)
+    self.assertEqual(payments.order_by('due_date').last().due_date, datetime.date(2024, 12, 1))
+    # Each payment counts towards the month it is due, and a rebuild agrees
+    months = [(datetime.date(2024, month, 1), 1) for month in range(1, 13)]
+    self.assertEqual(sorted(PaymentRollup.objects.values_list('month', 'count')), months)
+    call_command('rebuild_revenue_rollups', stdout=io.StringIO())
+    self.assertEqual(sorted(PaymentRollup.objects.values_list('month', 'count')), months)
+
+    # Complete schedules are not read again
+    with self.assertNumQueries(1):
+      response = self.client.post('/api/v1/payments/generate_schedule/', {}, format='json')
+    self.assertEqual(response.json(), {'agreements': 0, 'payments': 0, 'updated': 0, 'removed': 0})
+
+    agreement.rent_end_date = datetime.date(2025, 2, 28)
+    agreement.save()
+    response = self.client.post('/api/v1/payments/generate_schedule/', {}, format='json')
+    self.assertEqual(response.json(), {'agreements': 1, 'payments': 2, 'updated': 0, 'removed': 0})
+
+    # Shortening the period or changing the rent only touches pending rows
+    january = payments.get(due_date=datetime.date(2024, 1, 1))
+    january.status = 'completed'
+    january.save()
+    agreement.rent_end_date = datetime.date(2024, 6, 30)
+    agreement.rent_amount = Decimal('1200')
+    agreement.save()
+    response = self.client.post('/api/v1/payments/generate_schedule/', {}, format='json')
+    self.assertEqual(response.json(), {'agreements': 1, 'payments': 0, 'updated': 5, 'removed': 8})
+    self.assertEqual(
+      list(payments.order_by('due_date').values_list('amount', 'status'))[:2],
+      [(Decimal('1000'), 'completed'), (Decimal('1200'), 'pending')]
+    )
+    self.assertEqual(payments.count(), 6)
+    rollups = sorted(PaymentRollup.objects.filter(count__gt=0).values_list('month', 'status', 'count', 'amount'))
+    call_command('rebuild_revenue_rollups', stdout=io.StringIO())
+    self.assertEqual(sorted(PaymentRollup.objects.values_list('month', 'status', 'count', 'amount')), rollups)
+
+  def test_completing_drops_future_rent(self):
+    today = timezone.localdate()
+    agreement = Agreement.objects.first()
+    Property.objects.filter(pk=agreement.property_id).update(rent_or_buy='rent')
+    agreement.status = 'active'
+    agreement.rent_start_date = add_months(today.replace(day=1), -2)
+    agreement.rent_end_date = add_months(agreement.rent_start_date, 12) - datetime.timedelta(days=1)
+    agreement.save()
+    self.client.post('/api/v1/payments/generate_schedule/', {}, format='json')
+
+    response = self.client.post(f'/api/v1/agreements/{agreement.pk}/complete/')
+    self.assertEqual(response.status_code, 200)
+    payments = Payment.objects.filter(agreement=agreement)
+    self.assertEqual(payments.count(), 3)
+    self.assertFalse(payments.filter(due_date__gt=today).exists())
+    rollups = sorted(PaymentRollup.objects.filter(count__gt=0).values_list('month', 'status', 'count', 'amount'))
+    call_command('rebuild_revenue_rollups', stdout=io.StringIO())
+    self.assertEqual(sorted(PaymentRollup.objects.values_list('month', 'status', 'count', 'amount')), rollups)
+
+    # Arrears past the end of the period only count the months it ran
+    response = self.client.get('/api/v1/dashboard/arrears/', {'as_of': agreement.rent_end_date.isoformat()})
+    row = response.json()['results'][0]
+    self.assertEqual((row['expected_rent'], row['balance']), ('3000.00', '3000.00'))
+    self.assertEqual(row['overdue_since'], agreement.rent_start_date.isoformat())
+
+  def test_status_changes_through_transitions(self):
+    first = Agreement.objects.first()
+    second = Agreement.objects.create(
+      property=first.property,
+      customer=first.customer,
+      rent_start_date=datetime.date(2025, 1, 1),
+      rent_end_date=datetime.date(2025, 12, 31),
+    )
+
+    response = self.client.patch(f'/api/v1/agreements/{first.pk}/', {'status': 'active'}, format='json')
+    self.assertEqual(response.status_code, 400)
+
+    for action in ('approve', 'activate'):
+      response = self.client.post(f'/api/v1/agreements/{first.pk}/{action}/')
+      self.assertEqual(response.status_code, 200)
+    self.assertEqual(response.json()['status'], 'active')
+    self.assertEqual(Property.objects.get(pk=first.property_id).availability, 'sold')
+
+    self.client.post(f'/api/v1/agreements/{second.pk}/approve/')
+    response = self.client.post(f'/api/v1/agreements/{second.pk}/activate/')
+    self.assertEqual(response.status_code, 409)
+    response = self.client.post(f'/api/v1/agreements/{first.pk}/cancel/')
+    self.assertEqual(response.status_code, 409)
+
+    self.client.post(f'/api/v1/agreements/{first.pk}/complete/')
+    response = self.client.post(f'/api/v1/agreements/{second.pk}/activate/')
+    self.assertEqual(response.status_code, 200)
+
+    # Only pending and cancelled agreements can be deleted
+    self.assertEqual(self.client.delete(f'/api/v1/agreements/{first.pk}/').status_code, 409)
+    self.assertEqual(self.client.delete(f'/api/v1/agreements/{second.pk}/').status_code, 409)
+    pending = Agreement.objects.filter(status='pending').first()
+    self.assertEqual(self.client.delete(f'/api/v1/agreements/{pending.pk}/').status_code, 204)
+    self.assertFalse(Agreement.objects.filter(pk=pending.pk).exists())
+
+    self.assertEqual(APIClient().post(f'/api/v1/agreements/{second.pk}/cancel/').status_code, 401)
+
+  def test_payment_and_bill_lists_use_fixed_queries(self):
+    for agreement in Agreement.objects.all():
+      for month in range(1, 11):
+        Payment.objects.create(agreement=agreement, amount=Decimal('1000'))
+        UtilityBill.objects.create(
+          agreement=agreement, bill_type='electricity', bill_amount=Decimal('50'),
+          bill_date=datetime.date(2024, month, 1), due_date=datetime.date(2024, month, 15)
+        )
+
+    # Validators, count and one joined page query, however many rows
+    for url in ('/api/v1/payments/', '/api/v1/payments/user/', '/api/v1/utility-bills/', '/api/v1/utility-bills/user/'):
+      with self.assertNumQueries(3):
+        response = self.client.get(url, {'page_size': 100})
+      results = response.json()['results']
+      self.assertEqual(len(results), 30)
+      self.assertEqual(results[0]['agreement_details']['customer']['name'], 'Admin')
+
+  def test_arrears_report(self):
+    agreement = Agreement.objects.first()
+    for month in (1, 2, 3):
+      Payment.objects.create(
+        agreement=agreement, amount=Decimal('1000'), due_date=datetime.date(2024, month, 1),
+        status='completed' if month == 1 else 'pending'
+      )
+    UtilityBill.objects.create(
+      agreement=agreement, bill_type='water', bill_amount=Decimal('80'), paid_amount=Decimal('30'),
+      bill_date=datetime.date(2024, 1, 1), due_date=datetime.date(2024, 1, 10)
+    )
+    # Payments outside the rent schedule are not rent, here or on an
+    # agreement without a schedule
+    for unscheduled in Agreement.objects.all():
+      Payment.objects.create(agreement=unscheduled, amount=Decimal('500'), status='completed')
+
+    # Sorted ids, then the figures for the page
+    with self.assertNumQueries(2):
+      response = self.client.get('/api/v1/dashboard/arrears/', {'as_of': '2024-02-15'})
+    data = response.json()
+    self.assertEqual(data['count'], 1)
+    self.assertEqual(data['results'][0], {
+      'agreement_id': agreement.pk, 'status': 'pending', 'property_id': agreement.property_id,
+      'property_title': agreement.property.title, 'customer_id': agreement.customer_id,
+      'customer_name': 'Admin', 'expected_rent': '2000.00', 'paid': '1000.00', 'rent_due': '1000.00',
+      'unpaid_bills': '50.00', 'balance': '1050.00', 'overdue_since': '2024-01-10', 'days_overdue': 36,
+    })
+
+    response = self.client.get('/api/v1/dashboard/arrears/', {
+      'as_of': '2024-02-15', 'group_by': 'customer', 'owing': 'false', 'ordering': '-days_overdue'
+    })
+    self.assertEqual(response.json()['results'][0]['balance'], '1050.00')
+    response = self.client.get('/api/v1/dashboard/arrears/', {'as_of': '2024-02-15', 'owing': 'false'})
+    self.assertEqual(
+      [(row['paid'], row['balance']) for row in response.json()['results'][1:]],
+      [('0.00', '0.00'), ('0.00', '0.00')]
+    )
+    response = self.client.get('/api/v1/dashboard/arrears/', {'ordering': 'name'})
+    self.assertEqual(response.status_code, 400)
+
+  def test_dashboard_counters_follow_changes(self):
+    def stats():
+      with self.assertNumQueries(1):
+        return self.client.get('/api/v1/dashboard/stats/').json()
+
+    self.assertEqual(stats(), DashboardCounters.compute())
+    agreement = Agreement.objects.first()
+    agreement.status = 'active'
+    agreement.save()
+    self.assertEqual(stats()['sold_properties'], 1)
+
+    agreement.property.delete()
+    self.assertEqual(stats(), DashboardCounters.compute())
+    self.assertEqual(stats()['sold_properties'], 0)
+
+  def test_dashboard_counters_ignore_stale_deletes(self):
+    agreement = Agreement.objects.first()
+    stale_agreement = Agreement.objects.get(pk=agreement.pk)
+    agreement.status = 'active'
+    agreement.save()
+    stale_agreement.delete()
+    self.assertEqual(DashboardCounters.current(), DashboardCounters.compute())
+
+    agreement = Agreement.objects.first()
+    stale_house = Property.objects.get(pk=agreement.property_id)
+    agreement.status = 'active'
+    agreement.save()
+    self.assertEqual(Property.objects.get(pk=stale_house.pk).availability, 'sold')
+    stale_house.delete()
+    self.assertEqual(DashboardCounters.current(), DashboardCounters.compute())
+
+  def test_revenue_rollups_follow_payments_and_bills(self):
+    agreement = Agreement.objects.first()
+    payment = Payment.objects.create(agreement=agreement, amount=Decimal('500'), method='cash')
+    Payment.objects.create(agreement=agreement, amount=Decimal('250'), method='cheque', status='completed')
+    payment.status = 'completed'
+    payment.save()
+    bill = UtilityBill.objects.create(
+      agreement=agreement, bill_type='gas', bill_amount=Decimal('80'),
+      bill_date=payment.date, due_date=payment.date
+    )
+    bill.paid_amount = Decimal('80')
+    bill.paid_date = payment.date
+    bill.save()
+
+    month = payment.date.strftime('%Y-%m')
+    response = self.client.get('/api/v1/dashboard/revenue/', {
+      'start': month, 'end': month, 'status': 'completed', 'group_by': 'method'
+    })
+    self.assertEqual(response.json()['payments'], [
+      {'month': month, 'method': 'cash', 'count': 1, 'amount': '500.00'},
+      {'month': month, 'method': 'cheque', 'count': 1, 'amount': '250.00'},
+    ])
+    self.assertEqual(response.json()['utility_bills'], [
+      {'month': month, 'count': 1, 'billed_amount': '80.00', 'paid_count': 1, 'paid_amount': '80.00'},
+    ])
+
+  @override_settings(LIVE_DASHBOARD_POLL_INTERVAL=0)
+  def test_live_events_reach_every_subscriber(self):
+    async def subscribe():
+      return [broker.subscribe(), broker.subscribe()]
+
+    loop = asyncio.new_event_loop()
+    subscribers = loop.run_until_complete(subscribe())
+    try:
+      with self.captureOnCommitCallbacks(execute=True):
+        Agreement.objects.create(
+          property=create_property(title='New listing'),
+          customer=Customer.objects.get(),
+          rent_amount=Decimal('1000'),
+          rent_start_date=datetime.date(2024, 1, 1),
+          rent_end_date=datetime.date(2024, 12, 31),
+        )
+      loop.run_until_complete(asyncio.sleep(0))
+
+      for _, queue in subscribers:
+        events = [queue.get_nowait() for _ in range(queue.qsize())]
+        self.assertIn(('counters', {'pending_requests': 1}), events)
+        pending = [data for event, data in events if event == 'pending_agreement']
+        self.assertEqual(pending[0]['property_title'], 'New listing')
+    finally:
+      for subscriber in subscribers:
+        broker.unsubscribe(subscriber)
+      loop.close()
+
+  def test_live_events_need_asgi(self):
+    self.assertEqual(self.client.get('/api/v1/dashboard/events/').status_code, 501)
+
+  def test_live_event_tickets(self):
+    response = self.client.post('/api/v1/dashboard/events/ticket/')
+    self.assertEqual(response.status_code, 201)
+    ticket = response.json()['ticket']
+
+    def authenticate(params):
+      return authenticate_admin(RequestFactory().get('/api/v1/dashboard/events/', params))
+
+    self.assertEqual(authenticate({'ticket': ticket}), self.user)
+    self.assertIsNone(authenticate({'ticket': ticket + 'x'}))
+    self.assertIsNone(authenticate({'token': str(AccessToken.for_user(self.user))}))
+    self.assertIsNone(read_ticket(ticket, max_age=-1))
+
+    self.user.is_admin = False
+    self.user.save()
+    self.assertIsNone(authenticate({'ticket': ticket}))
+    self.assertEqual(self.client.post('/api/v1/dashboard/events/ticket/').status_code, 403)
+
+
+def photo(width=1000, height=600, color='red', name='photo.jpg'):
+  buffer = io.BytesIO()
+  Image.new('RGB', (width, height), color).save(buffer, 'JPEG')
+  return ContentFile(buffer.getvalue(), name=name)
+
+
+class MediaTests(TestCase):
+  def setUp(self):
+    media_root = tempfile.mkdtemp()
+    self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+    self.enterContext(override_settings(MEDIA_ROOT=media_root, PROPERTY_IMAGE_VARIANTS_ASYNC=False))
+    cache.clear()
+    self.user = User.objects.create_user(email='admin@email.com', name='Admin', password='admin123')
+    self.client = APIClient()
+    self.client.force_authenticate(self.user)
+    self.house = create_property(title='House')
+
+  def add_image(self, content):
+    with self.captureOnCommitCallbacks(execute=True):
+      image = PropertyImage.objects.create(property=self.house, image=content)
+    image.refresh_from_db()
+    return image
+
+  def test_variants_are_generated_with_absolute_srcset(self):
+    image = self.add_image(photo())
+    self.assertEqual(image.variants_status, 'ready')
+    # Never wider than the original
+    self.assertEqual(sorted(image.variants['webp'], key=int), ['320', '640', '1000'])
+
+    response = self.client.get(f'/api/v1/properties/{self.house.pk}/')
+    srcset = response.json()['images'][0]['srcset']
+    self.assertEqual(set(srcset), {'webp', 'jpeg'})
+    for candidate in srcset['webp'].split(', '):
+      self.assertTrue(candidate.startswith('http://testserver/media/cas/'), candidate)
+    self.assertTrue(srcset['webp'].endswith(' 1000w'))
+
+    # Regenerating releases the old files instead of piling up references
+    call_command('generate_image_variants', '--all', stdout=io.StringIO())
+    names = [name for widths in image.variants.values() for name in widths.values()]
+    self.assertEqual(set(StoredFile.objects.filter(name__in=names).values_list('ref_count', flat=True)), {1})
+
+  def test_duplicate_uploads_share_one_file(self):
+    first = self.add_image(photo())
+    second = self.add_image(photo(name='copy.jpg'))
+    storage = first.image.storage
+    self.assertEqual(first.image.name, second.image.name)
+    self.assertEqual(StoredFile.objects.get(name=first.image.name).ref_count, 2)
+
+    with self.captureOnCommitCallbacks(execute=True):
+      first.delete()
+    self.assertEqual(StoredFile.objects.get(name=second.image.name).ref_count, 1)
+    self.assertTrue(storage.exists(second.image.name))
+
+    with self.captureOnCommitCallbacks(execute=True):
+      second.delete()
+    self.assertFalse(StoredFile.objects.filter(name=second.image.name).exists())
+    self.assertFalse(storage.exists(second.image.name))
+
+  def set_avatar(self, content):
+    with self.captureOnCommitCallbacks(execute=True):
+      self.user.avatar = content
+      self.user.save()
+    return self.user.avatar.name
+
+  def test_replacing_a_file_releases_the_old_one(self):
+    storage = self.user.avatar.storage
+    red = self.set_avatar(photo())
+    self.assertEqual(StoredFile.objects.get(name=red).ref_count, 1)
+
+    # The same bytes again keep a single reference
+    self.assertEqual(self.set_avatar(photo(name='again.jpg')), red)
+    self.assertEqual(StoredFile.objects.get(name=red).ref_count, 1)
+
+    blue = self.set_avatar(photo(color='blue'))
+    self.assertFalse(StoredFile.objects.filter(name=red).exists())
+    self.assertFalse(storage.exists(red))
+    self.assertEqual(StoredFile.objects.get(name=blue).ref_count, 1)
+
+    # Saves that leave the field alone don't touch the references
+    with self.captureOnCommitCallbacks(execute=True):
+      self.user.name = 'Renamed'
+      self.user.save()
+    self.assertEqual(StoredFile.objects.get(name=blue).ref_count, 1)
+
+    self.set_avatar(None)
+    self.assertFalse(storage.exists(blue))
+
+  def test_rehash_media_merges_legacy_files(self):
+    storage = self.user.avatar.storage
+    other = User.objects.create_user(email='other@email.com', name='Other', password='other123')
+    os.makedirs(storage.path('avatars'))
+    for user, name in ((self.user, 'avatars/a.jpg'), (other, 'avatars/b.jpg')):
+      with open(storage.path(name), 'wb') as file:
+        file.write(photo().read())
+      User.objects.filter(pk=user.pk).update(avatar=name)
+
+    call_command('rehash_media', stdout=io.StringIO())
+    names = set(User.objects.filter(pk__in=[self.user.pk, other.pk]).values_list('avatar', flat=True))
+    self.assertEqual(len(names), 1)
+    name = names.pop()
+    self.assertTrue(name.startswith('cas/'))
+    self.assertEqual(StoredFile.objects.get(name=name).ref_count, 2)
+    self.assertTrue(storage.exists(name))
+    self.assertFalse(storage.exists('avatars/a.jpg'))
+    self.assertFalse(storage.exists('avatars/b.jpg'))
@@ -1,5 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from .live import dashboard_events
 from .views import (
     PropertyViewSet, 
     PropertyCategoryViewSet, 
@@ -9,6 +10,9 @@ from .views import (
     PaymentViewSet,
     UtilityBillViewSet,
     get_dashboard_stats,
+    create_dashboard_events_ticket,
+    get_revenue_timeseries,
+    get_arrears_report,
     AccountViewSet,
     LedgerViewSet,
     TransactionViewSet
@@ -29,4 +33,8 @@ router.register(r'transactions', TransactionViewSet)
 urlpatterns = [
   path('', include(router.urls)),
   path('dashboard/stats/', get_dashboard_stats, name='dashboard-stats'),
+  path('dashboard/revenue/', get_revenue_timeseries, name='dashboard-revenue'),
+  path('dashboard/arrears/', get_arrears_report, name='dashboard-arrears'),
+  path('dashboard/events/', dashboard_events, name='dashboard-events'),
+  path('dashboard/events/ticket/', create_dashboard_events_ticket, name='dashboard-events-ticket'),
 ]
@@ -1,26 +1,50 @@
 from rest_framework import viewsets, filters
-from rest_framework.pagination import PageNumberPagination
-from .models import Property, PropertyCategory, PropertyType, Customer, Agreement, PropertyImage, Payment, UtilityBill, Account, Ledger, Transaction
-from .serializers import PropertySerializer, PropertyCategorySerializer, PropertyTypeSerializer, CustomerSerializer, PaymentSerializer, UtilityBillSerializer, AccountSerializer, LedgerSerializer, TransactionSerializer
+from .models import Property, PropertyCategory, PropertyType, Customer, Agreement, PropertyImage, Payment, UtilityBill, Account, Ledger, Transaction, DashboardCounters, PaymentRollup, UtilityBillRollup
+from .serializers import PropertySerializer, PropertyListSerializer, PropertyCategorySerializer, PropertyTypeSerializer, CustomerSerializer, CustomerSummarySerializer, PaymentSerializer, UtilityBillSerializer, AccountSerializer, LedgerSerializer, TransactionSerializer
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
 from .serializers import AgreementSerializer
 from rest_framework import status
 from django.utils import timezone
-from rest_framework.permissions import IsAdminUser
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from django.core.exceptions import ValidationError as DjangoValidationError
+from decimal import Decimal, InvalidOperation
+import datetime
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Sum
+import math
+from .geo import box_filter, distance_expression, radius_box
+from .pagination import GeneralPagination, CursorOnlyPagination, PageNumberOnlyPagination
+from .search import FullTextSearchFilter
+from .cache import CachedResponseMixin, get_counters
+from .conditional import ConditionalGetMixin
+from .exporter import ExportMixin
+from .importer import FORMATS as IMPORT_FORMATS, PropertyImporter, detect_format, iter_rows
+from .facets import IGNORED_PARAMS as FACET_IGNORED_PARAMS, facet_counts
+from .autocomplete import prefix_index
+from .availability import MAX_PROPERTIES as CALENDAR_MAX_PROPERTIES, booking_calendar
+from .schedules import RentScheduler
+from .arrears import LEVELS as ARREARS_LEVELS, ORDERINGS as ARREARS_ORDERINGS, arrears_ids, arrears_rows
+from .live import TICKET_MAX_AGE, issue_ticket
+from django.conf import settings
 
-class GeneralPagination(PageNumberPagination):
-  page_size = 10  # Default page size
-  page_size_query_param = 'page_size'
-  max_page_size = 100000
-
-class PropertyViewSet(viewsets.ModelViewSet):
+# CachedResponseMixin goes first so cache hits answer conditional requests
+# from the stored validators instead of aggregating the filtered queryset
+class PropertyViewSet(ExportMixin, CachedResponseMixin, ConditionalGetMixin, viewsets.ModelViewSet):
   queryset = Property.objects.all()
   serializer_class = PropertySerializer
-  filter_backends = [filters.OrderingFilter, filters.SearchFilter]
-  ordering_fields = ['created_at']
+  filter_backends = [filters.OrderingFilter, FullTextSearchFilter]
+  ordering_fields = ['created_at', 'price']
   search_fields = ['title', 'description', 'address']
   pagination_class = GeneralPagination
+  cursor_ordering = ('-created_at', '-id')
+  cache_models = ('property', 'propertyimage', 'agreement', 'propertycategory', 'propertytype')
+  export_fields = (
+    'id', 'title', 'description', 'price', 'address', 'city', 'status', 'rent_or_buy',
+    'availability', 'bedroom', 'washroom', 'area', 'property_category__name',
+    'property_type__name', 'created_at', 'updated_at'
+  )
 
   def get_queryset(self):
     queryset = Property.objects.all()
@@ -35,32 +59,192 @@ class PropertyViewSet(viewsets.ModelViewSet):
       queryset = queryset.filter(property_type_id=type_id)
     if rent_or_buy in ['rent', 'buy']:
       queryset = queryset.filter(rent_or_buy=rent_or_buy)
+
+    # Attribute filters; rent_or_buy + city + price range is covered by a
+    # composite index
+    city = self.request.query_params.get('city')
+    min_price = self.get_number_param('min_price')
+    max_price = self.get_number_param('max_price')
+    min_area = self.get_number_param('min_area')
+    bedrooms = self.get_number_param('bedrooms', integer=True)
+
+    if city:
+      queryset = queryset.filter(city=city)
+    if min_price is not None:
+      queryset = queryset.filter(price__gte=min_price)
+    if max_price is not None:
+      queryset = queryset.filter(price__lte=max_price)
+    if min_area is not None:
+      queryset = queryset.filter(area__gte=min_area)
+    if bedrooms is not None:
+      queryset = queryset.filter(bedroom__gte=bedrooms)
+
+    # Map filters: the geohash index prunes to a few cells before the exact
+    # box/distance test runs. A bbox with min_lng > max_lng, or a radius
+    # reaching past ±180, wraps across the antimeridian.
+    near = self.get_coordinates_param('near', 2)
+    bbox = self.get_coordinates_param('bbox', 4)
+    if bbox:
+      min_lng, min_lat, max_lng, max_lat = bbox
+      queryset = queryset.filter(box_filter(min_lat, min_lng, max_lat, max_lng))
+    if near:
+      latitude, longitude = near
+      radius = self.get_number_param('radius')
+      if radius is not None and radius <= 0:
+        raise ValidationError({'radius': 'Must be greater than zero.'})
+      radius = float(radius) if radius is not None else 2.0
+      queryset = queryset.filter(
+        box_filter(*radius_box(latitude, longitude, radius))
+      ).annotate(
+        distance=distance_expression(latitude, longitude)
+      ).filter(distance__lte=radius)
       
-    # Handle dashboard filters
+    # Handle dashboard filters against the denormalized availability column
     if not filter_type:
         # Show only available properties (not sold or rented)
-        queryset = queryset.exclude(
-            agreements__status='active'
-        )
+        queryset = queryset.exclude(availability__in=['sold', 'rented'])
     elif filter_type == 'all':
         pass
     elif filter_type == 'sold':
-        queryset = queryset.filter(
-            agreements__status='active',
-            rent_or_buy='buy'
-        )
+        queryset = queryset.filter(availability='sold')
     elif filter_type == 'rent':
-        queryset = queryset.filter(
-            agreements__status='active',
-            rent_or_buy='rent'
-        )
+        queryset = queryset.filter(availability='rented')
     elif filter_type == 'hold':
         queryset = queryset.filter(status='inactive')
     elif filter_type == 'pending':
-        queryset = queryset.filter(agreements__status='pending')
+        # Properties whose availability is pending: a pending or approved
+        # agreement and no active one. A rented property with a future
+        # booking is listed under 'rent'.
+        queryset = queryset.filter(availability='pending')
     
-    queryset = queryset.order_by('-created_at')
-    return queryset.distinct()
+    if near:
+      queryset = queryset.order_by('distance', '-created_at')
+    else:
+      queryset = queryset.order_by('-created_at')
+    return self.get_serializer().setup_eager_loading(queryset)
+
+  def get_serializer_class(self):
+    if self.action == 'list':
+      return PropertyListSerializer
+    return PropertySerializer
+
+  # Filters compare against columns of at most 12 digits
+  max_number_param = Decimal(10) ** 12
+
+  def get_number_param(self, name, integer=False):
+    value = self.request.query_params.get(name)
+    if value in (None, ''):
+      return None
+    try:
+      number = Decimal(value)
+    except InvalidOperation:
+      raise ValidationError({name: 'A valid number is required.'})
+    # Decimal also parses NaN, Infinity and huge exponents
+    if not number.is_finite() or abs(number) >= self.max_number_param:
+      raise ValidationError({name: f'A number below {self.max_number_param} in magnitude is required.'})
+    if integer:
+      if number != number.to_integral_value():
+        raise ValidationError({name: 'A whole number is required.'})
+      return int(number)
+    return number
+
+  def get_coordinates_param(self, name, count):
+    value = self.request.query_params.get(name)
+    if not value:
+      return None
+    try:
+      numbers = [float(part) for part in value.split(',')]
+    except ValueError:
+      numbers = []
+    if len(numbers) != count or not all(map(math.isfinite, numbers)):
+      raise ValidationError({name: f'Expected {count} comma-separated numbers.'})
+    return numbers
+
+  def get_date_param(self, name):
+    value = self.request.query_params.get(name)
+    if not value:
+      return None
+    try:
+      return datetime.date.fromisoformat(value)
+    except ValueError:
+      raise ValidationError({name: 'Expected a date as YYYY-MM-DD.'})
+
+  def get_ids_param(self, name, limit):
+    try:
+      ids = list(dict.fromkeys(int(part) for part in self.request.query_params.get(name, '').split(',') if part))
+    except ValueError:
+      raise ValidationError({name: 'Expected comma-separated ids.'})
+    if not ids or len(ids) > limit:
+      raise ValidationError({name: f'Between 1 and {limit} ids are required.'})
+    return ids
+
+  @action(detail=False, methods=['get'], url_path='facets', url_name='facets')
+  def facets(self, request):
+    # Counts for the current filter set; cached briefly on the normalized
+    # filters so paging through results reuses the same entry
+    return self.cached_response(
+      request,
+      lambda: Response(facet_counts(self.filter_queryset(self.get_queryset()))),
+      timeout=getattr(settings, 'PROPERTIES_FACETS_CACHE_TIMEOUT', 60),
+      ignored_params=FACET_IGNORED_PARAMS
+    )
+
+  @action(detail=False, methods=['get'], url_path='autocomplete', url_name='autocomplete')
+  def autocomplete(self, request):
+    try:
+      limit = min(max(int(request.query_params.get('limit', 10)), 1), 25)
+    except ValueError:
+      raise ValidationError({'limit': 'A valid integer is required.'})
+    return Response({'results': prefix_index.suggest(request.query_params.get('q', ''), limit)})
+
+  @action(detail=False, methods=['get'], url_path='calendar', url_name='calendar')
+  def calendar(self, request):
+    # Booked and free ranges of several properties over one window,
+    # ?ids=1,2,3&start=2025-01-01&end=2025-03-31
+    property_ids = self.get_ids_param('ids', CALENDAR_MAX_PROPERTIES)
+    start = self.get_date_param('start') or timezone.localdate()
+    end = self.get_date_param('end') or start + datetime.timedelta(days=90)
+    if end < start:
+      raise ValidationError({'end': 'End date cannot be before the start date.'})
+    return Response({'start': start, 'end': end, 'results': booking_calendar(property_ids, start, end)})
+
+  @action(detail=False, methods=['get'], url_path='cache_stats', url_name='cache_stats', permission_classes=[IsAdminUser])
+  def cache_stats(self, request):
+    return Response(get_counters())
+
+  @action(detail=False, methods=['post'], url_path='import', url_name='import', permission_classes=[IsAdminUser])
+  def bulk_import(self, request):
+    upload = request.FILES.get('file')
+    if not upload:
+      return Response(
+        {'error': 'file is required'},
+        status=status.HTTP_400_BAD_REQUEST
+      )
+
+    file_format = request.data.get('format') or detect_format(upload.name)
+    if file_format not in IMPORT_FORMATS:
+      return Response(
+        {'error': f"format must be one of {', '.join(IMPORT_FORMATS)}"},
+        status=status.HTTP_400_BAD_REQUEST
+      )
+
+    try:
+      batch_size = min(max(int(request.data.get('batch_size', 500)), 1), 5000)
+    except (TypeError, ValueError):
+      return Response(
+        {'error': 'batch_size must be a number'},
+        status=status.HTTP_400_BAD_REQUEST
+      )
+
+    importer = PropertyImporter(batch_size=batch_size)
+    try:
+      summary = importer.run(iter_rows(upload, file_format))
+    except UnicodeDecodeError:
+      return Response(
+        {'error': 'file must be UTF-8 encoded', **importer.summary()},
+        status=status.HTTP_400_BAD_REQUEST
+      )
+    return Response(summary, status=status.HTTP_200_OK)
 
   @action(detail=True, methods=['delete'])
   def delete_image(self, request, pk=None):
@@ -107,11 +291,21 @@ class CustomerViewSet(viewsets.ModelViewSet):
   queryset = Customer.objects.all()
   serializer_class = CustomerSerializer
   pagination_class = GeneralPagination
+  cursor_ordering = ('-id',)
+
+  def get_queryset(self):
+    queryset = Customer.objects.order_by('-id')
+    return self.get_serializer().setup_eager_loading(queryset)
+
+  def get_serializer_class(self):
+    if self.request.method == 'GET' and self.request.query_params.get('view') == 'summary':
+      return CustomerSummarySerializer
+    return CustomerSerializer
 
   @action(detail=False, methods=['get'], url_path='get', url_name='get_customer')
   def get_customer(self, request):
     user = request.user
-    customer = Customer.objects.filter(user=user).first()  # Check if customer exists for the logged-in user
+    customer = self.get_queryset().filter(user=user).first()  # Check if customer exists for the logged-in user
     if customer:
       serializer = self.get_serializer(customer)
       return Response({'customer': serializer.data}) 
@@ -119,31 +313,88 @@ class CustomerViewSet(viewsets.ModelViewSet):
   
   @action(detail=False, methods=['get'], url_path='active_customers', url_name='active_customers')
   def get_active_customers(self, request):
-    # Get all customers who have at least one agreement
-    customers_with_agreements = Customer.objects.filter(
-      agreements__isnull=False  # Ensure customer has at least one agreement
-    ).distinct()
-    
-    serializer = self.get_serializer(customers_with_agreements, many=True)
-    return Response({'results': serializer.data})
+    # Customers with at least one agreement; EXISTS stops at the first one
+    # and needs no DISTINCT over the join
+    customers_with_agreements = self.get_queryset().filter(
+      Exists(Agreement.objects.filter(customer=OuterRef('pk')))
+    )
+
+    page = self.paginate_queryset(customers_with_agreements)
+    serializer = self.get_serializer(page, many=True)
+    return self.get_paginated_response(serializer.data)
 
 
-class AgreementViewSet(viewsets.ModelViewSet):
+class AgreementViewSet(ExportMixin, ConditionalGetMixin, viewsets.ModelViewSet):
+  cache_models = ('agreement', 'property', 'propertyimage', 'propertycategory', 'propertytype', 'customer', 'user')
+  export_fields = (
+    'id', 'property_id', 'property__title', 'customer_id', 'customer__user__name',
+    'customer__user__email', 'status', 'rent_amount', 'rent_start_date', 'rent_end_date',
+    'purchase_amount', 'purchase_date', 'security_amount', 'created_at', 'updated_at'
+  )
+
   def get_queryset(self):
     user = self.request.user
     if user.is_admin:
-      return Agreement.objects.all().order_by('-created_at')
+      queryset = Agreement.objects.all().order_by('-created_at')
     else:
-      return Agreement.objects.filter(customer__user=user).order_by('-created_at')
+      queryset = Agreement.objects.filter(customer__user=user).order_by('-created_at')
+    return self.get_serializer().setup_eager_loading(queryset)
 
   queryset = Agreement.objects.all()
   serializer_class = AgreementSerializer
   pagination_class = GeneralPagination
 
-class PaymentViewSet(viewsets.ModelViewSet):
+  def run_transition(self, action):
+    agreement = self.get_object()
+    try:
+      agreement = agreement.transition(action)
+    except DjangoValidationError as error:
+      return Response({'status': error.messages}, status=status.HTTP_409_CONFLICT)
+    return Response(self.get_serializer(agreement).data)
+
+  @action(detail=True, methods=['post'], permission_classes=[IsAdminUser])
+  def approve(self, request, pk=None):
+    return self.run_transition('approve')
+
+  @action(detail=True, methods=['post'], permission_classes=[IsAdminUser])
+  def activate(self, request, pk=None):
+    return self.run_transition('activate')
+
+  @action(detail=True, methods=['post'], permission_classes=[IsAdminUser])
+  def complete(self, request, pk=None):
+    return self.run_transition('complete')
+
+  @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+  def cancel(self, request, pk=None):
+    # Customers can withdraw their own requests; get_object() only finds theirs
+    return self.run_transition('cancel')
+
+  def destroy(self, request, *args, **kwargs):
+    # Approved, active and completed agreements are history; they are
+    # cancelled or completed rather than deleted. The status is re-read
+    # under the property lock so a concurrent transition can't slip in.
+    agreement = self.get_object()
+    with transaction.atomic():
+      Property.lock(agreement.property_id)
+      current = Agreement.objects.select_for_update().filter(pk=agreement.pk).values_list('status', flat=True).first()
+      if current is not None and current not in Agreement.DELETABLE_STATUSES:
+        return Response(
+          {'status': [f"Cannot delete an agreement that is {current}."]},
+          status=status.HTTP_409_CONFLICT
+        )
+      agreement.delete()
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+class PaymentViewSet(ExportMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = Payment.objects.all()
     serializer_class = PaymentSerializer
     pagination_class = GeneralPagination
+    cursor_ordering = ('-created_at', '-id')
+    cache_models = ('payment', 'agreement', 'property', 'customer', 'user')
+    export_fields = (
+        'id', 'agreement_id', 'agreement__property__title', 'agreement__customer__user__name',
+        'status', 'method', 'amount', 'date', 'due_date', 'created_at', 'updated_at'
+    )
 
     @action(detail=False, methods=['get'])
     def user(self, request):
@@ -151,13 +402,32 @@ class PaymentViewSet(viewsets.ModelViewSet):
         payments = Payment.objects.filter(
             agreement__customer__user=request.user
         ).order_by('-created_at')
+        payments = self.get_serializer().setup_eager_loading(payments)
         
-        page = self.paginate_queryset(payments)
+        etag, last_modified = self.get_queryset_validators(payments)
+        return self.conditional_response(
+            request, etag, last_modified,
+            lambda: self.render_list(payments)
+        )
+
+    @action(detail=False, methods=['post'], url_path='generate_schedule', url_name='generate_schedule', permission_classes=[IsAdminUser])
+    def generate_schedule(self, request):
+        # Pending rent payments for every active agreement, or only for
+        # {"agreements": [ids]}
+        agreement_ids = request.data.get('agreements')
+        if agreement_ids is not None and (
+            not isinstance(agreement_ids, list) or not all(isinstance(pk, int) for pk in agreement_ids)
+        ):
+            raise ValidationError({'agreements': 'Expected a list of agreement ids.'})
+        return Response(RentScheduler().run(agreement_ids))
+
+    def render_list(self, queryset):
+        page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
             return self.get_paginated_response(serializer.data)
 
-        serializer = self.get_serializer(payments, many=True)
+        serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
     def get_queryset(self):
@@ -177,7 +447,7 @@ class PaymentViewSet(viewsets.ModelViewSet):
         if customer_id:
             queryset = queryset.filter(agreement__customer_id=customer_id)
         
-        return queryset.order_by('-created_at')
+        return self.get_serializer().setup_eager_loading(queryset.order_by('-created_at'))
 
     def partial_update(self, request, *args, **kwargs):
         payment = self.get_object()
@@ -204,10 +474,17 @@ class PaymentViewSet(viewsets.ModelViewSet):
         
         return super().partial_update(request, *args, **kwargs)
 
-class UtilityBillViewSet(viewsets.ModelViewSet):
+class UtilityBillViewSet(ExportMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = UtilityBill.objects.all()
     serializer_class = UtilityBillSerializer
     pagination_class = GeneralPagination
+    cursor_ordering = ('-bill_date', '-id')
+    cache_models = ('utilitybill', 'agreement', 'property', 'customer', 'user')
+    export_fields = (
+        'id', 'agreement_id', 'agreement__property__title', 'agreement__customer__user__name',
+        'bill_type', 'bill_amount', 'paid_amount', 'bill_date', 'due_date', 'paid_date',
+        'created_at', 'updated_at'
+    )
 
     @action(detail=False, methods=['get'])
     def user(self, request):
@@ -215,13 +492,21 @@ class UtilityBillViewSet(viewsets.ModelViewSet):
         bills = UtilityBill.objects.filter(
             agreement__customer__user=request.user
         ).order_by('-bill_date')
+        bills = self.get_serializer().setup_eager_loading(bills)
         
-        page = self.paginate_queryset(bills)
+        etag, last_modified = self.get_queryset_validators(bills)
+        return self.conditional_response(
+            request, etag, last_modified,
+            lambda: self.render_list(bills)
+        )
+
+    def render_list(self, queryset):
+        page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
             return self.get_paginated_response(serializer.data)
 
-        serializer = self.get_serializer(bills, many=True)
+        serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
     def get_queryset(self):
@@ -241,7 +526,7 @@ class UtilityBillViewSet(viewsets.ModelViewSet):
         if customer_id:
             queryset = queryset.filter(agreement__customer_id=customer_id)
         
-        return queryset.order_by('-bill_date')
+        return self.get_serializer().setup_eager_loading(queryset.order_by('-bill_date'))
 
     def partial_update(self, request, *args, **kwargs):
         bill = self.get_object()
@@ -266,33 +551,112 @@ class UtilityBillViewSet(viewsets.ModelViewSet):
 @api_view(['GET'])
 @permission_classes([IsAdminUser])
 def get_dashboard_stats(request):
-    # Get total properties
-    total_properties = Property.objects.count()
-    
-    # Get properties by status
-    sold_properties = Agreement.objects.filter(
-        status='active',
-        property__rent_or_buy='buy'
-    ).count()
-    
-    on_rent = Agreement.objects.filter(
-        status='active',
-        property__rent_or_buy='rent'
-    ).count()
-    
-    on_hold = Property.objects.filter(status='inactive').count()
-    
-    # Get pending requests (agreements)
-    pending_requests = Agreement.objects.filter(status='pending').count()
+    # One primary-key lookup on the counters row maintained by signals; with
+    # DASHBOARD_COUNTERS_ENABLED off, one conditional-aggregate query instead
+    if getattr(settings, 'DASHBOARD_COUNTERS_ENABLED', True):
+        return Response(DashboardCounters.current())
+    return Response(DashboardCounters.compute())
+
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def create_dashboard_events_ticket(request):
+    # A short-lived ticket for opening dashboard/events/ with ?ticket=, since
+    # EventSource cannot send the Authorization header
+    return Response(
+        {'ticket': issue_ticket(request.user), 'expires_in': TICKET_MAX_AGE},
+        status=status.HTTP_201_CREATED
+    )
+
+def parse_month(request, name, default):
+    value = request.query_params.get(name)
+    if not value:
+        return default
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m').date()
+    except ValueError:
+        raise ValidationError({name: 'Expected a month as YYYY-MM.'})
+
+def rollup_series(queryset, dimensions, measures):
+    rows = queryset.values('month', *dimensions).annotate(
+        **{measure: Sum(measure) for measure in measures}
+    ).order_by('month', *dimensions)
+    series = []
+    for row in rows:
+        row['month'] = row['month'].strftime('%Y-%m')
+        for measure in measures:
+            if isinstance(row[measure], Decimal):
+                row[measure] = str(row[measure].quantize(Decimal('0.01')))
+        series.append(row)
+    return series
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_revenue_timeseries(request):
+    # Monthly totals read from the rollup tables (properties/rollups.py),
+    # optionally split by ?group_by= and narrowed by dimension filters
+    today = timezone.localdate().replace(day=1)
+    end = parse_month(request, 'end', today)
+    # Twelve months up to and including `end` unless given
+    months = end.year * 12 + end.month - 1 - 11
+    start = parse_month(request, 'start', datetime.date(months // 12, months % 12 + 1, 1))
+    if start > end:
+        raise ValidationError({'start': 'start must not be after end.'})
+
+    group_by = [name for name in request.query_params.get('group_by', '').split(',') if name]
+    payment_dimensions = ('method', 'status', 'rent_or_buy')
+    bill_dimensions = ('bill_type', 'rent_or_buy')
+    unknown = set(group_by) - set(payment_dimensions) - set(bill_dimensions)
+    if unknown:
+        raise ValidationError({'group_by': f"Unknown dimension(s): {', '.join(sorted(unknown))}"})
+
+    payments = PaymentRollup.objects.filter(month__range=(start, end))
+    bills = UtilityBillRollup.objects.filter(month__range=(start, end))
+    for name in payment_dimensions:
+        if request.query_params.get(name):
+            payments = payments.filter(**{name: request.query_params[name]})
+    for name in bill_dimensions:
+        if request.query_params.get(name):
+            bills = bills.filter(**{name: request.query_params[name]})
 
     return Response({
-        'total_properties': total_properties,
-        'sold_properties': sold_properties,
-        'on_rent': on_rent,
-        'on_hold': on_hold,
-        'pending_requests': pending_requests
+        'start': start.strftime('%Y-%m'),
+        'end': end.strftime('%Y-%m'),
+        'payments': rollup_series(
+            payments, [name for name in group_by if name in payment_dimensions], ('count', 'amount')
+        ),
+        'utility_bills': rollup_series(
+            bills, [name for name in group_by if name in bill_dimensions],
+            ('count', 'billed_amount', 'paid_count', 'paid_amount')
+        ),
     })
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def get_arrears_report(request):
+    # Outstanding rent and bills per agreement, or per customer with
+    # ?group_by=customer, summed by the database (properties/arrears.py).
+    # Only rows that owe something unless ?owing=false.
+    level = request.query_params.get('group_by', 'agreement')
+    if level not in ARREARS_LEVELS:
+        raise ValidationError({'group_by': f"Expected one of: {', '.join(ARREARS_LEVELS)}"})
+    ordering = request.query_params.get('ordering', '-balance')
+    if ordering.lstrip('-') not in ARREARS_ORDERINGS:
+        raise ValidationError({'ordering': f"Expected one of: {', '.join(ARREARS_ORDERINGS)}, optionally prefixed with -"})
+    as_of = request.query_params.get('as_of')
+    try:
+        as_of = datetime.date.fromisoformat(as_of) if as_of else timezone.localdate()
+    except ValueError:
+        raise ValidationError({'as_of': 'Expected a date as YYYY-MM-DD.'})
+
+    paginator = PageNumberOnlyPagination()
+    ids = paginator.paginate_queryset(
+        arrears_ids(level, as_of, ordering, owing=request.query_params.get('owing') != 'false'),
+        request
+    )
+    response = paginator.get_paginated_response(arrears_rows(level, as_of, list(ids)))
+    response.data['as_of'] = as_of
+    return response
+
 class AccountViewSet(viewsets.ModelViewSet):
     queryset = Account.objects.all()
     serializer_class = AccountSerializer
@@ -321,6 +685,8 @@ class TransactionViewSet(viewsets.ModelViewSet):
     queryset = Transaction.objects.all()
     serializer_class = TransactionSerializer
     filterset_fields = ['ledger', 'type', 'date']
+    pagination_class = CursorOnlyPagination
+    cursor_ordering = ('-date', '-created_at', '-id')
 
     def get_queryset(self):
         queryset = Transaction.objects.all()
@@ -5,6 +5,10 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
+
+The live dashboard stream (api/v1/dashboard/events/) is only served through
+this application, e.g. ``uvicorn real_estate_server.asgi:application``.
+Browsers open it with a ticket from api/v1/dashboard/events/ticket/.
 """
 
 import os
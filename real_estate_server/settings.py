@@ -87,6 +87,26 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# Works with the local-memory or file-based backends. Processes only see
+# each other's invalidations through a shared cache, so use FileBasedCache
+# (or memcached/redis) when running more than one worker process;
+# `manage.py check --deploy` warns otherwise.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+PROPERTIES_CACHE_ALIAS = 'default'
+PROPERTIES_CACHE_TIMEOUT = 300  # seconds
+PROPERTIES_FACETS_CACHE_TIMEOUT = 60  # seconds
+DASHBOARD_COUNTERS_ENABLED = True  # False computes the dashboard with one aggregate query
+LIVE_DASHBOARD_POLL_INTERVAL = 5  # seconds between checks for changes made by other processes; 0 disables
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -153,6 +173,22 @@ CORS_ALLOW_CREDENTIALS = True
 MEDIA_URL = '/media/'  # This is the URL to access uploaded files
 MEDIA_ROOT = BASE_DIR / 'media'  # Path where files will be saved
 
+# Uploaded files are stored by content hash and de-duplicated, see
+# properties/storage.py
+STORAGES = {
+    'default': {
+        'BACKEND': 'properties.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
+# Resized copies generated for every PropertyImage (see properties/images.py)
+PROPERTY_IMAGE_VARIANT_WIDTHS = (320, 640, 1280)
+PROPERTY_IMAGE_VARIANT_WORKERS = 2
+PROPERTY_IMAGE_VARIANTS_ASYNC = True
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),  # Changed from default to 1 day
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),  # You might want to adjust this too